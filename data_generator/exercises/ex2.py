@@ -1,6 +1,5 @@
 import itertools
-import os
-import yaml
+import sys
 
 from data_generator.pipelines import (
     gen_admin_tables,
@@ -9,13 +8,17 @@ from data_generator.pipelines import (
     idGenerator,
     duplicate_patient_visit,
     deduplicate_patient,
+    run_strata,
+    cache_key,
+    cached_write_tables,
+    load_conf,
+    env_n_jobs,
 )
 
 import numpy as np
 import pandas as pd
 
-dir_path = os.path.dirname(os.path.realpath(__file__))
-conf = yaml.safe_load(open(os.path.join(dir_path, "..", "conf.yaml")))
+conf = load_conf()
 
 dict_param = {
     "control": {"final_survival_ratio": 0.5, "death_saturation_day": 10},
@@ -25,85 +28,86 @@ dict_param = {
 
 list_age_range = [(0, 5), (5, 18), (18, 25), (25, 65), (65, 100)]
 list_gender = [("f"), ("m")]
-np.random.seed(42)
 n_patient_per_cat = 100
 
-id_generator = idGenerator()
 
-df_person, df_visit, df_cond, df_med, df_dedup_proba, df_dedup_hard, df_dedup = (
-    [],
-    [],
-    [],
-    [],
-    [],
-    [],
-    [],
-)
-for age_range, gender in itertools.product(list_age_range, list_gender):
-    for case, params in dict_param.items():
-        params = params.copy()
-        if case == "drugA" and gender == ("f") and age_range == (5, 18):
-            params = dict_param["control"]
-        if case == "drugA" and gender == ("f") and age_range == (18, 25):
-            params["final_survival_ratio"] = 0.6
-
-        df_person_tmp, df_visit_tmp = gen_admin_tables(
-            n=n_patient_per_cat,
-            id_generator=id_generator,
-            age_range=age_range,
-            gender_list=gender,
-            final_survival_ratio=params["final_survival_ratio"],
-            death_saturation_day=params["death_saturation_day"],
-        )
+def gen_stratum(stratum, id_generator):
+    age_range, gender, case = stratum
+    params = dict_param[case].copy()
+    if case == "drugA" and gender == ("f") and age_range == (5, 18):
+        params = dict_param["control"]
+    if case == "drugA" and gender == ("f") and age_range == (18, 25):
+        params["final_survival_ratio"] = 0.6
+
+    df_person_tmp, df_visit_tmp = gen_admin_tables(
+        n=n_patient_per_cat,
+        id_generator=id_generator,
+        age_range=age_range,
+        gender_list=gender,
+        final_survival_ratio=params["final_survival_ratio"],
+        death_saturation_day=params["death_saturation_day"],
+    )
 
-        if case == "drugB":
-            df_person_tmp, df_visit_tmp, df_dedup_tmp = duplicate_patient_visit(
-                df_person_tmp, df_visit_tmp, id_generator, duplication_ratio=0.8
-            )
-            df_dedup_hard_tmp, df_dedup_proba_tmp = deduplicate_patient(
-                df_person_tmp, df_dedup_tmp, transco="probabilistic"
-            )
-        else:
-            df_dedup_tmp, df_dedup_hard_tmp, df_dedup_proba_tmp = (
-                pd.DataFrame([]),
-                pd.DataFrame([]),
-                pd.DataFrame([]),
-            )
-
-        df_cim10_tmp = gen_condition_table(
-            df_visit_tmp, id_generator, list_good_cim10=conf["list_flu_cim10"]
+    if case == "drugB":
+        df_person_tmp, df_visit_tmp, df_dedup_tmp = duplicate_patient_visit(
+            df_person_tmp, df_visit_tmp, id_generator, duplication_ratio=0.8
+        )
+        df_dedup_hard_tmp, df_dedup_proba_tmp = deduplicate_patient(
+            df_person_tmp, df_dedup_tmp, transco="probabilistic"
+        )
+    else:
+        df_dedup_tmp, df_dedup_hard_tmp, df_dedup_proba_tmp = (
+            pd.DataFrame([]),
+            pd.DataFrame([]),
+            pd.DataFrame([]),
         )
 
-        (
-            df_med_tmp,
-            _,
-            _,
-        ) = gen_med_table(df_visit_tmp, df_person_tmp, case, id_generator)
-
-        df_person.append(df_person_tmp)
-        df_visit.append(df_visit_tmp)
-        df_cond.append(df_cim10_tmp)
-        df_med.append(df_med_tmp)
-        df_dedup_hard.append(df_dedup_hard_tmp)
-        df_dedup_proba.append(df_dedup_proba_tmp)
-        df_dedup.append(df_dedup_tmp)
-
-pd.concat(df_cond, axis=0).sample(frac=1).to_pickle(
-    "exercises/exercise2/data/df_condition.pkl"
-)
-pd.concat(df_med, axis=0).sample(frac=1).to_pickle(
-    "exercises/exercise2/data/df_med.pkl"
-)
-pd.concat(df_visit, axis=0).sample(frac=1).to_pickle(
-    "exercises/exercise2/data/df_visit.pkl"
-)
-pd.concat(df_person, axis=0).sample(frac=1).to_pickle(
-    "exercises/exercise2/data/df_person.pkl"
-)
-pd.concat(df_dedup_proba, axis=0).sample(frac=1).to_pickle(
-    "exercises/exercise2/data/df_dedup_proba.pkl"
-)
-pd.concat(df_dedup_hard, axis=0).sample(frac=1).to_pickle(
-    "exercises/exercise2/data/df_dedup_deterministic.pkl"
-)
-pd.concat(df_dedup, axis=0).to_pickle("exercises/exercise2/data/df_dedup.pkl")
+    df_cim10_tmp = gen_condition_table(
+        df_visit_tmp, id_generator, list_good_cim10=conf["list_flu_cim10"]
+    )
+
+    (
+        df_med_tmp,
+        _,
+        _,
+    ) = gen_med_table(df_visit_tmp, df_person_tmp, case, id_generator)
+
+    return {
+        "person": df_person_tmp,
+        "visit": df_visit_tmp,
+        "condition": df_cim10_tmp,
+        "med": df_med_tmp,
+        "dedup_deterministic": df_dedup_hard_tmp,
+        "dedup_proba": df_dedup_proba_tmp,
+        "dedup": df_dedup_tmp,
+    }
+
+
+def gen_tables(n_jobs=1):
+    np.random.seed(42)
+
+    id_generator = idGenerator()
+
+    tables = run_strata(
+        gen_stratum,
+        itertools.product(list_age_range, list_gender, dict_param),
+        id_generator,
+        n_jobs=n_jobs,
+    )
+
+    # shuffle rows (except for the dedup table)
+    tables = {
+        name: df if name == "dedup" else df.sample(frac=1)
+        for name, df in tables.items()
+    }
+    return tables
+
+
+if __name__ == "__main__":
+    # python ex2.py [format], with $EDS_TUTORIAL_JOBS processes (see env_n_jobs)
+    cached_write_tables(
+        lambda: gen_tables(env_n_jobs()),
+        "exercises/exercise2/data",
+        cache_key(files=[__file__]),
+        format=sys.argv[1] if len(sys.argv) > 1 else "pickle",
+    )
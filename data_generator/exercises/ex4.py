@@ -1,6 +1,5 @@
 import itertools
-import os
-import yaml
+import sys
 
 from data_generator.pipelines import (
     gen_admin_tables,
@@ -8,13 +7,16 @@ from data_generator.pipelines import (
     gen_med_table,
     gen_note_table,
     gen_nlp_extracted_table,
-    idGenerator,
+    DatasetCache,
+    LazyDataset,
+    TableDAG,
+    cache_key,
+    cached_write_tables,
+    load_conf,
+    env_n_jobs,
 )
-import numpy as np
-import pandas as pd
 
-dir_path = os.path.dirname(os.path.realpath(__file__))
-conf = yaml.safe_load(open(os.path.join(dir_path, "..", "conf.yaml")))
+conf = load_conf()
 
 # list of synonyms of the two drugs
 drugA_terms = ["drugA", "pneumo-drug", "SpinA"]
@@ -63,84 +65,138 @@ dict_param = {
 
 list_age_range = [(0, 5), (5, 18), (18, 25), (25, 65), (65, 100)]
 list_gender = [("f"), ("m")]
-np.random.seed(42 * 2)
 n_patient_per_cat = 100
 
-id_generator = idGenerator()
 
-df_person, df_visit, df_cond, df_note, df_note_nlp, df_med, df_med_all = (
-    [],
-    [],
-    [],
-    [],
-    [],
-    [],
-    [],
-)
-for age_range, gender in itertools.product(list_age_range, list_gender):
-    for case, params in dict_param.items():
-
-        params = params.copy()
-        if case == "drugA" and gender == ("f") and age_range == (5, 18):
-            for p in ["final_survival_ratio", "death_saturation_day"]:
-                params[p] = dict_param["control"][p]
-        # @todo : durty : counter-balance random effects
-        if age_range == (18, 25) and case in ["drugA", "drugB"]:
-            params["final_survival_ratio"] = 0.6
-
-        df_person_tmp, df_visit_tmp = gen_admin_tables(
-            n=n_patient_per_cat,
-            id_generator=id_generator,
-            age_range=age_range,
-            gender_list=gender,
-            final_survival_ratio=params["final_survival_ratio"],
-            death_saturation_day=params["death_saturation_day"],
-        )
-        df_cim10_tmp = gen_condition_table(
-            df_visit_tmp,
-            id_generator=id_generator,
-            list_good_cim10=conf["list_flu_cim10"],
-        )
-        df_note_tmp = gen_note_table(
-            df_visit_tmp,
-            params["terms"],
-            params["sentences"],
-            id_generator=id_generator,
-            duplicate_note_per_visit_ratio={2: 0.3},
-        )
-        df_note_nlp_tmp, _, _ = gen_nlp_extracted_table(
-            df_visit_tmp, df_person_tmp, case, id_generator
-        )
+def case_params(*names):
+    # parameters of each case, hashed by the nodes that use them
+    return {case: {p: params[p] for p in names} for case, params in dict_param.items()}
 
-        df_med_tmp, _, _, = gen_med_table(
-            df_visit_tmp,
-            df_person_tmp,
-            case,
-            id_generator,
-            proportion=params["proportion_well_classified"],
-        )
-        df_med_tmp = df_med_tmp.dropna(subset=["drug_source_value"]).reset_index(
-            drop=True
+
+def gen_admin(stratum, tables, id_generator, n, survival):
+    age_range, gender, case = stratum
+    params = survival[case].copy()
+    if case == "drugA" and gender == ("f") and age_range == (5, 18):
+        params = survival["control"].copy()
+    # @todo : durty : counter-balance random effects
+    if age_range == (18, 25) and case in ["drugA", "drugB"]:
+        params["final_survival_ratio"] = 0.6
+
+    df_person_tmp, df_visit_tmp = gen_admin_tables(
+        n=n,
+        id_generator=id_generator,
+        age_range=age_range,
+        gender_list=gender,
+        final_survival_ratio=params["final_survival_ratio"],
+        death_saturation_day=params["death_saturation_day"],
+    )
+    return {"person": df_person_tmp, "visit": df_visit_tmp}
+
+
+def gen_condition(stratum, tables, id_generator, list_good_cim10):
+    return {
+        "condition": gen_condition_table(
+            tables["visit"], id_generator=id_generator, list_good_cim10=list_good_cim10
         )
+    }
+
+
+def gen_note(stratum, tables, id_generator, notes):
+    case = stratum[2]
+    df_note_tmp = gen_note_table(
+        tables["visit"],
+        notes[case]["terms"],
+        notes[case]["sentences"],
+        id_generator=id_generator,
+        duplicate_note_per_visit_ratio={2: 0.3},
+    )
+    return {"note": df_note_tmp}
+
+
+def gen_note_nlp(stratum, tables, id_generator):
+    df_note_nlp_tmp, _, _ = gen_nlp_extracted_table(
+        tables["visit"], tables["person"], stratum[2], id_generator
+    )
+    return {"note_nlp": df_note_nlp_tmp}
+
+
+def gen_med(stratum, tables, id_generator, proportion):
+    case = stratum[2]
+    df_med_tmp, _, _ = gen_med_table(
+        tables["visit"],
+        tables["person"],
+        case,
+        id_generator,
+        proportion=proportion[case]["proportion_well_classified"],
+    )
+    df_med_tmp = df_med_tmp.dropna(subset=["drug_source_value"]).reset_index(
+        drop=True
+    )
+    return {"med": df_med_tmp}
+
+
+def gen_med_all(stratum, tables, id_generator):
+    df_med_all_tmp, _, _ = gen_med_table(
+        tables["visit"], tables["person"], stratum[2], id_generator
+    )
+    return {"med_all": df_med_all_tmp}
+
+
+def build_dataset(store=None, n_jobs=1):
+    # tables are drawn on first access: dataset["note"] only draws the admin and note nodes
+    dag = TableDAG(
+        itertools.product(list_age_range, list_gender, dict_param),
+        seed=42 * 2,
+        store=store,
+        n_jobs=n_jobs,
+    )
+    dag.add(
+        "admin",
+        gen_admin,
+        ["person", "visit"],
+        params={
+            "n": n_patient_per_cat,
+            "survival": case_params("final_survival_ratio", "death_saturation_day"),
+        },
+    )
+    dag.add(
+        "condition",
+        gen_condition,
+        ["condition"],
+        inputs=["admin"],
+        params={"list_good_cim10": conf["list_flu_cim10"]},
+    )
+    dag.add(
+        "note",
+        gen_note,
+        ["note"],
+        inputs=["admin"],
+        params={"notes": case_params("terms", "sentences")},
+    )
+    dag.add("note_nlp", gen_note_nlp, ["note_nlp"], inputs=["admin"])
+    dag.add(
+        "med",
+        gen_med,
+        ["med"],
+        inputs=["admin"],
+        params={"proportion": case_params("proportion_well_classified")},
+    )
+    dag.add("med_all", gen_med_all, ["med_all"], inputs=["admin"])
+    return LazyDataset(dag)
+
+
+def gen_tables(tables=None, n_jobs=1):
+    dataset = build_dataset(DatasetCache(), n_jobs)
+    return {name: dataset[name] for name in (dataset if tables is None else tables)}
+
 
-        (
-            df_med_all_tmp,
-            _,
-            _,
-        ) = gen_med_table(df_visit_tmp, df_person_tmp, case, id_generator)
-
-        df_person.append(df_person_tmp)
-        df_visit.append(df_visit_tmp)
-        df_cond.append(df_cim10_tmp)
-        df_note.append(df_note_tmp)
-        df_note_nlp.append(df_note_nlp_tmp)
-        df_med.append(df_med_tmp)
-        df_med_all.append(df_med_all_tmp)
-
-pd.concat(df_cond, axis=0).to_pickle("exercises/exercise4/data/df_condition.pkl")
-pd.concat(df_note, axis=0).to_pickle("exercises/exercise4/data/df_note.pkl")
-pd.concat(df_note_nlp, axis=0).to_pickle("exercises/exercise4/data/df_note_nlp.pkl")
-pd.concat(df_visit, axis=0).to_pickle("exercises/exercise4/data/df_visit.pkl")
-pd.concat(df_person, axis=0).to_pickle("exercises/exercise4/data/df_person.pkl")
-pd.concat(df_med, axis=0).to_pickle("exercises/exercise4/data/df_med.pkl")
-pd.concat(df_med_all, axis=0).to_pickle("exercises/exercise4/data/df_med_all.pkl")
+if __name__ == "__main__":
+    # python ex4.py [format] [table ...] only draws the given tables (all by default), with
+    # $EDS_TUTORIAL_JOBS processes (see env_n_jobs)
+    tables = sys.argv[2:] or None
+    cached_write_tables(
+        lambda: gen_tables(tables, env_n_jobs()),
+        "exercises/exercise4/data",
+        cache_key({"tables": tables}, files=[__file__]),
+        format=sys.argv[1] if len(sys.argv) > 1 else "pickle",
+    )
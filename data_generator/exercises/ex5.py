@@ -1,6 +1,6 @@
 import itertools
 import os
-import yaml
+import sys
 
 from data_generator.pipelines import (
     gen_admin_tables,
@@ -9,7 +9,13 @@ from data_generator.pipelines import (
     gen_bio_table,
     uniform_drawing,
     gen_comorb_table,
-    idGenerator,
+    frame_drawing,
+    DatasetCache,
+    TableDAG,
+    cache_key,
+    cached_write_tables,
+    load_conf,
+    env_n_jobs,
 )
 import numpy as np
 import pandas as pd
@@ -17,7 +23,7 @@ from ast import literal_eval
 import os
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
-conf = yaml.safe_load(open(os.path.join(dir_path, "..", "conf.yaml")))
+conf = load_conf()
 
 config = pd.read_csv(
     os.path.join(dir_path, "..", "config", "config_ex4.csv"),
@@ -37,8 +43,9 @@ def bio_drawing(bio_concept, age_range, gender, case):
         (config.age == age_range) & (config.gender == gender) & (config.case == case)
     ][bio_concept].squeeze()
 
-    def f(row):
-        return round(np.random.normal(mu, sigma), 2)
+    @frame_drawing
+    def f(df, rng):
+        return np.round(rng.normal(mu, sigma, len(df)), 2)
 
     return f
 
@@ -62,17 +69,19 @@ list_gender = [("f"), ("m")]
 list_case = [("control"), ("drugB")]
 list_diabetes_cim10 = ["E10", "E11", "E12"]
 list_atcd_cancer_cim10 = ["Z851", "Z852", "Z853"]
-np.random.seed(42)
+# bio measurements: (concept, unit, ratio)
+list_bio_measurement = [
+    ("bmi", "kg.cm^-2", 1),
+    ("crp", "mg/L", 1),
+    ("urea", "mmol/L", 1),
+    ("hb", "g/dL", 1),
+]
 # n_patient_per_cat = 50
 
-id_generator = idGenerator()
 
-df_person, df_visit, df_cond, df_med, df_bio = [], [], [], [], []
-for age_range, gender, case in itertools.product(
-    list_age_range, list_gender, list_case
-):
-
-    params = (
+def stratum_params(stratum):
+    age_range, gender, case = stratum
+    return (
         config.loc[
             (config.age == age_range)
             & (config.gender == gender)
@@ -82,64 +91,125 @@ for age_range, gender, case in itertools.product(
         .to_dict()
     )
 
-    n_patient_per_cat = params["n_patient_per_cat"]
+
+def gen_admin(stratum, tables, id_generator):
+    age_range, gender, case = stratum
+    params = stratum_params(stratum)
 
     df_person_tmp, df_visit_tmp = gen_admin_tables(
-        n=n_patient_per_cat,
+        n=params["n_patient_per_cat"],
         id_generator=id_generator,
         age_range=age_range,
         gender_list=gender,
         final_survival_ratio=params["final_survival_ratio"],
         death_saturation_day=params["death_saturation_day"],
     )
-    df_med_tmp, _, _ = gen_med_table(df_visit_tmp, df_person_tmp, case, id_generator)
-    # ICD10 codes associated to the principal disease
-    df_cim10_tmp = gen_condition_table(
-        df_visit_tmp, id_generator, list_good_cim10=conf["list_flu_cim10"]
+    return {"person": df_person_tmp, "visit": df_visit_tmp}
+
+
+def gen_med(stratum, tables, id_generator):
+    age_range, gender, case = stratum
+    df_med_tmp, _, _ = gen_med_table(
+        tables["visit"], tables["person"], case, id_generator
     )
+    return {"med": df_med_tmp}
+
+
+def gen_condition(stratum, tables, id_generator, list_good_cim10):
+    # ICD10 codes associated to the principal disease
+    return {
+        "condition_disease": gen_condition_table(
+            tables["visit"], id_generator, list_good_cim10=list_good_cim10
+        )
+    }
+
+
+def gen_comorb(stratum, tables, id_generator, list_comorb):
     # ICD10 codes associated to comorbidities
     df_comorb_tmp = gen_comorb_table(
-        df_visit_tmp,
+        tables["visit"],
         id_generator,
-        df_person_tmp,
-        df_med_tmp,
+        tables["person"],
+        tables["med"],
         list_comorb=[
-            (
-                list_atcd_cancer_cim10,
-                1,
-                comorb_drawing("cancer", age_range, gender, case),
-            ),
-            (
-                list_diabetes_cim10,
-                1,
-                comorb_drawing("diabete", age_range, gender, case),
-            ),
+            (list_cim10, 1, comorb_drawing(comorb_name, *stratum))
+            for comorb_name, list_cim10 in list_comorb
         ],
     )
-    df_cim10_tmp = pd.concat([df_cim10_tmp, df_comorb_tmp], axis=0)
+    return {
+        "condition": pd.concat([tables["condition_disease"], df_comorb_tmp], axis=0)
+    }
+
 
+def gen_bio(stratum, tables, id_generator, list_measurement):
     # Add bio measures
     df_bio_tmp = gen_bio_table(
-        df_visit_tmp,
+        tables["visit"],
         id_generator,
-        df_person_tmp,
-        df_med_tmp,
+        tables["person"],
+        tables["med"],
         list_measurement=[
-            ("bmi", "kg.cm^-2", 1, bio_drawing("bmi", age_range, gender, case)),
-            ("crp", "mg/L", 1, bio_drawing("crp", age_range, gender, case)),
-            ("urea", "mmol/L", 1, bio_drawing("urea", age_range, gender, case)),
-            ("hb", "g/dL", 1, bio_drawing("hb", age_range, gender, case)),
+            (bio_concept, unit, ratio, bio_drawing(bio_concept, *stratum))
+            for bio_concept, unit, ratio in list_measurement
         ],
     )
+    return {"bio": df_bio_tmp}
 
-    df_person.append(df_person_tmp)
-    df_visit.append(df_visit_tmp)
-    df_cond.append(df_cim10_tmp)
-    df_med.append(df_med_tmp)
-    df_bio.append(df_bio_tmp)
-
-pd.concat(df_cond, axis=0).to_pickle("exercises/exercise5/data/df_condition.pkl")
-pd.concat(df_med, axis=0).to_pickle("exercises/exercise5/data/df_med.pkl")
-pd.concat(df_visit, axis=0).to_pickle("exercises/exercise5/data/df_visit.pkl")
-pd.concat(df_person, axis=0).to_pickle("exercises/exercise5/data/df_person.pkl")
-pd.concat(df_bio, axis=0).to_pickle("exercises/exercise5/data/df_bio.pkl")
+
+def build_dag(store=None, n_jobs=1, list_measurement=list_bio_measurement):
+    # changing the parameters of a node (or the functions it calls) only draws again the node and its
+    # downstream nodes, e.g. list_measurement only affects bio
+    dag = TableDAG(
+        itertools.product(list_age_range, list_gender, list_case),
+        seed=42,
+        store=store,
+        n_jobs=n_jobs,
+    )
+    config_file = os.path.join(dir_path, "..", "config", "config_ex4.csv")
+    dag.add("admin", gen_admin, ["person", "visit"], files=[config_file])
+    dag.add("med", gen_med, ["med"], inputs=["admin"])
+    dag.add(
+        "condition_disease",
+        gen_condition,
+        ["condition_disease"],
+        inputs=["admin"],
+        params={"list_good_cim10": conf["list_flu_cim10"]},
+    )
+    dag.add(
+        "condition",
+        gen_comorb,
+        ["condition"],
+        inputs=["admin", "med", "condition_disease"],
+        params={
+            "list_comorb": [
+                ("cancer", list_atcd_cancer_cim10),
+                ("diabete", list_diabetes_cim10),
+            ]
+        },
+        files=[config_file],
+    )
+    dag.add(
+        "bio",
+        gen_bio,
+        ["bio"],
+        inputs=["admin", "med"],
+        params={"list_measurement": list_measurement},
+        files=[config_file],
+    )
+    return dag
+
+
+def gen_tables(n_jobs=1):
+    return build_dag(DatasetCache(), n_jobs).run(
+        ["person", "visit", "condition", "med", "bio"]
+    )
+
+
+if __name__ == "__main__":
+    # python ex5.py [format], with $EDS_TUTORIAL_JOBS processes (see env_n_jobs)
+    cached_write_tables(
+        lambda: gen_tables(env_n_jobs()),
+        "exercises/exercise5/data",
+        cache_key(files=[__file__]),
+        format=sys.argv[1] if len(sys.argv) > 1 else "pickle",
+    )
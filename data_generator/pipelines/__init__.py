@@ -4,17 +4,28 @@ from .admin_tables import (
     deduplicate_patient,
 )
 from .bio_tables import gen_bio_table
+from .cache import DatasetCache, cache_key, cached_write_tables
 from .condition_tables import (
     gen_condition_table,
     gen_comorb_table,
     uniform_drawing,
 )
+from .dag import LazyDataset, TableDAG
 from .med_tables import gen_med_table
 from .note_tables import gen_note_table, gen_nlp_extracted_table, note_transcoding
+from .runner import env_n_jobs, run_strata, stream_strata
+from .scenario import compile_scenario, load_scenario, run_plan, run_scenario
+from .schema import compact_table, compact_tables
+from .streaming import gen_chunk, stream_tables
+from .writer import DatasetWriter, read_table, write_tables
 from .utils import (
     idGenerator,
+    idAllocator,
     apply_timeliness_per_hosp,
     apply_deployment_per_hosp,
     apply_hosp_anomaly,
     draw_random_date,
+    frame_drawing,
+    as_frame_drawing,
+    load_conf,
 )
@@ -1,35 +1,14 @@
 import numpy as np
 import datetime
-from sklearn.preprocessing import normalize
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 from .utils import *
-import os
-import yaml
 import dateutil
 
 
-dir_path = os.path.dirname(os.path.realpath(__file__))
-conf = yaml.safe_load(open(os.path.join(dir_path, "..", "conf.yaml")))
-
-n_days_survival = conf["max_stay_duration"]
-
-def gen_gender(gender_list, gender_noise=False, nan_age_proba=None):
+def _gender_options(gender_list, gender_noise=False, nan_age_proba=None):
     """
-    Generate a gender info.
-
-    Parameters
-    ----------
-    gender_list: list[str],
-        list of possible gender.
-    gender_noise: bool,
-        if True, add 'male' and 'female' to the gender possibilities
-    nan_age_proba: float (default None)
-        if not None, replace nan_age_proba% of results by np.nan
-    Returns
-    -------
-    - gender: str
-
+    Check gender_list and return the possible genders with their probabilities (None if uniform).
     """
     control_gender_list = [el for el in gender_list if el not in ["male", "female"]]
     if len(control_gender_list) > 2:
@@ -49,14 +28,81 @@ def gen_gender(gender_list, gender_noise=False, nan_age_proba=None):
         remaining_proba = 1.0 - nan_age_proba
         n_gender = len(gender_list)
         p_gender = [remaining_proba / n_gender] * n_gender + [nan_age_proba]
-        gender = np.random.choice(list(gender_list) + [np.nan], 1, p=p_gender)[0]
+        return list(gender_list) + [np.nan], p_gender
+    return list(gender_list), None
+
+
+def _source_options(source_list):
+    """
+    Return the EHR names of source_list and their normalized probabilities.
+    """
+    cat_source_list = [el[0] for el in source_list]
+    p_source_list = np.array([el[1] for el in source_list], dtype=float)
+    p_source_list = p_source_list / np.abs(p_source_list).sum()
+    return cat_source_list, p_source_list
+
+
+def gen_gender(gender_list, gender_noise=False, nan_age_proba=None, rng=None):
+    """
+    Generate a gender info.
+
+    Parameters
+    ----------
+    gender_list: list[str],
+        list of possible gender.
+    gender_noise: bool,
+        if True, add 'male' and 'female' to the gender possibilities
+    nan_age_proba: float (default None)
+        if not None, replace nan_age_proba% of results by np.nan
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+    Returns
+    -------
+    - gender: str
+
+    """
+    rng = check_rng(rng)
+    gender_options, p_gender = _gender_options(gender_list, gender_noise, nan_age_proba)
+    if p_gender is not None:
+        gender = rng.choice(gender_options, 1, p=p_gender)[0]
     else:
-        gender = np.random.choice(list(gender_list))
+        gender = rng.choice(gender_options)
     return gender
 
 
+def gen_genders(n, gender_list, gender_noise=False, nan_age_proba=None, rng=None):
+    """
+    Generate n gender info at once (batch version of gen_gender).
+
+    Parameters
+    ----------
+    n: int,
+        number of genders to draw.
+    gender_list: list[str],
+        list of possible gender.
+    gender_noise: bool,
+        if True, add 'male' and 'female' to the gender possibilities
+    nan_age_proba: float (default None)
+        if not None, replace nan_age_proba% of results by np.nan
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+    Returns
+    -------
+    - gender: np array of object
+    """
+    rng = check_rng(rng)
+    gender_options, p_gender = _gender_options(gender_list, gender_noise, nan_age_proba)
+    return np.asarray(gender_options, dtype=object)[
+        rng.choice(len(gender_options), n, p=p_gender)
+    ]
+
+
 def gen_visit_start_datetime(
-    study_start_date, epidemic_duration_months, censoring_ratio=None
+    study_start_date,
+    epidemic_duration_months,
+    censoring_ratio=None,
+    epidemic_intensity=None,
+    rng=None,
 ):
     """
     Draw on start_datetime.
@@ -69,29 +115,97 @@ def gen_visit_start_datetime(
         number of months of the epidemic.
     censoring_ratio: float (default: None)
         exp. factor in the increasing exp. used to draw start dates. If None, a random date is drawn uniformly.
+    epidemic_intensity: callable (default: None)
+        intensity of visits given the array of day numbers since the epidemic start (overrides censoring_ratio).
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     start_datetime: datetime.datetime
     """
-    if censoring_ratio is not None:
+    rng = check_rng(rng)
+    if epidemic_intensity is not None:
+        epidemic_start_date = study_start_date - dateutil.relativedelta.relativedelta(
+            months=epidemic_duration_months
+        )
+        visit_start_datetime = draw_tabulated_dates(
+            epidemic_start_date,
+            date_intensity_table(
+                epidemic_start_date, study_start_date, epidemic_intensity
+            ),
+            rng=rng,
+        ).astype(datetime.date)
+    elif censoring_ratio is not None:
         visit_start_datetime = draw_exp_random_date(
             censoring_ratio,
             study_start_date
             - dateutil.relativedelta.relativedelta(months=epidemic_duration_months),
             study_start_date,
+            rng,
         )
     else:
         visit_start_datetime = draw_random_date(
             study_start_date
             - dateutil.relativedelta.relativedelta(months=epidemic_duration_months),
             study_start_date,
+            rng,
         )
     return visit_start_datetime
 
 
+def gen_visit_start_datetimes(
+    n,
+    study_start_date,
+    epidemic_duration_months,
+    censoring_ratio=None,
+    epidemic_intensity=None,
+    rng=None,
+):
+    """
+    Draw n start_datetime at once (batch version of gen_visit_start_datetime).
+
+    Parameters
+    ----------
+    n: int,
+        number of dates to draw.
+    study_start_date: datetime.date,
+        date from which start_datetime is drawn.
+    epidemic_duration_months: int,
+        number of months of the epidemic.
+    censoring_ratio: float (default: None)
+        exp. factor in the increasing exp. used to draw start dates. If None, a random date is drawn uniformly.
+    epidemic_intensity: callable (default: None)
+        intensity of visits given the array of day numbers since the epidemic start (overrides censoring_ratio).
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    start_datetime: np array of datetime64[D]
+    """
+    rng = check_rng(rng)
+    epidemic_start_date = study_start_date - dateutil.relativedelta.relativedelta(
+        months=epidemic_duration_months
+    )
+    if epidemic_intensity is not None:
+        return draw_tabulated_dates(
+            epidemic_start_date,
+            date_intensity_table(
+                epidemic_start_date, study_start_date, epidemic_intensity
+            ),
+            n,
+            rng,
+        )
+    if censoring_ratio is not None:
+        return draw_exp_random_dates(
+            censoring_ratio, epidemic_start_date, study_start_date, n, rng
+        )
+    return draw_random_dates(epidemic_start_date, study_start_date, n, rng)
+
+
 def gen_care_site_id(
-    list_hospital, hospital_proba=None, age_range_per_hospital=None, age=None
+    list_hospital, hospital_proba=None, age_range_per_hospital=None, age=None, rng=None
 ):
     """
     Draw care_site_id.
@@ -106,17 +220,20 @@ def gen_care_site_id(
         age_range tuple for each hospital id.
     age: int,
         age of the patient.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     care_site_id: str
     """
+    rng = check_rng(rng)
 
     def draw_hospital():
         if hospital_proba is None:
-            return np.random.choice(list_hospital, 1)[0]
+            return rng.choice(list_hospital, 1)[0]
         else:
-            return np.random.choice(list_hospital, 1, p=hospital_proba)[0]
+            return rng.choice(list_hospital, 1, p=hospital_proba)[0]
 
     care_site_id = draw_hospital()
     if age_range_per_hospital is not None:
@@ -124,23 +241,73 @@ def gen_care_site_id(
             care_site_id in age_range_per_hospital
             and age <= age_range_per_hospital[care_site_id][1]
             and age >= age_range_per_hospital[care_site_id][0]
-            and np.random.random() >= 0.05
+            and rng.random() >= 0.05
         ):
             care_site_id = draw_hospital()
 
     return care_site_id
 
 
+def gen_care_site_ids(
+    age, list_hospital, hospital_proba=None, age_range_per_hospital=None, rng=None
+):
+    """
+    Draw a care_site_id for each patient (batch version of gen_care_site_id).
+
+    Parameters
+    ----------
+    age: np array of int,
+        age of the patients.
+    list_hospital: list[str],
+        list of str in which sampling ids.
+    hospital_proba: list[float],
+        list of float between 0 and 1 summing to 1 (each value is the probability to draw the hospital with the same index in list_hospital).
+    age_range_per_hospital: dict,
+        age_range tuple for each hospital id.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    care_site_id: np array of object
+    """
+    rng = check_rng(rng)
+    i_hospital = rng.choice(len(list_hospital), len(age), p=hospital_proba)
+    if age_range_per_hospital is not None:
+        age_min, age_max = np.array(
+            [
+                age_range_per_hospital.get(hospital, (np.inf, -np.inf))
+                for hospital in list_hospital
+            ],
+            dtype=float,
+        ).T
+        # same rejection as gen_care_site_id, on the patients still to be (re)drawn
+        redraw = np.ones(len(age), dtype=bool)
+        while redraw.any():
+            idx = np.flatnonzero(redraw)
+            redraw[idx] = (
+                (age[idx] <= age_max[i_hospital[idx]])
+                & (age[idx] >= age_min[i_hospital[idx]])
+                & (rng.random(len(idx)) >= 0.05)
+            )
+            idx = np.flatnonzero(redraw)
+            i_hospital[idx] = rng.choice(
+                len(list_hospital), len(idx), p=hospital_proba
+            )
+    return np.asarray(list_hospital, dtype=object)[i_hospital]
+
+
 def gen_end_datetime(
     study_start_date,
     visit_start_datetime,
     final_survival_ratio,
-    y_survival_curve,
+    death_saturation_day,
     care_site_id,
     list_hospital_with_no_death=(),
+    rng=None,
 ):
     """
-    Draw visit_end_datetime.
+    Draw visit_end_datetime (gen_end_datetimes for a single visit).
 
     Parameters
     ----------
@@ -149,50 +316,103 @@ def gen_end_datetime(
     visit_start_datetime: datetime.date
     final_survival_ratio: float,
         final offset of the survival curve.
-    y_survival_curve: float,
-        exp. factor of the survival curve.
+    death_saturation_day: int,
+        inflexion point of the survival curve.
     care_site_id: str
     list_hospital_with_no_death: list[str],
         list of hospital for which final_survival_ratio_loc is one (no death).
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
-    visit_end_datetime: datetime.datetime
+    death_date: datetime.date (np.nan if no death)
+    visit_end_datetime: datetime.date (np.nan if unknown)
     """
-    # change "final_survival_ratio_loc" if the bias "no death for this care site" is set
-    if care_site_id in list_hospital_with_no_death:
-        final_survival_ratio_loc = 1.0
-    else:
-        final_survival_ratio_loc = final_survival_ratio
-
-    if np.random.random() < 1 - final_survival_ratio_loc:  # if death happens
-        # init variables such that we enter the following "while" loop
-        death_day, death_date = n_days_survival + 1, study_start_date
-        # the number od
-        while death_day > n_days_survival and death_date >= study_start_date:
-            # draw the y value in the survival curve (between 1-x=start-, and final_survival_ratio_loc-x=end-)
-            rand_survival = np.random.uniform(final_survival_ratio_loc, 1.0)
-            # get the nb of day between visit_start_date and death, as the x-axis value of the 'rand_survival' y-axis value
-            death_day = int(np.argmin(abs(y_survival_curve - rand_survival)))
-            # death_date = visit_start_date + death_day
-            death_date = visit_start_datetime + datetime.timedelta(days=death_day)
-        visit_end_datetime = death_date
-    else:  # death does not happen
-        # no death date
-        death_date = np.nan
-        # draw random number of stay day
-        stay_days = np.random.randint(1, n_days_survival + 1)
-        # visit end = visit start + stay_days
-        visit_end_datetime = visit_start_datetime + datetime.timedelta(days=stay_days)
-        # if visit_end_datetime is later than study_start_date, visit_end_datetime is then unknown
-        # (and will be censored in the survival analysis)
-        if visit_end_datetime >= study_start_date:
-            visit_end_datetime = np.nan
+    death_date, visit_end_datetime = gen_end_datetimes(
+        study_start_date,
+        np.array([np.datetime64(visit_start_datetime, "D")]),
+        final_survival_ratio,
+        death_saturation_day,
+        np.array([care_site_id], dtype=object),
+        list_hospital_with_no_death,
+        rng,
+    )
+    return tuple(
+        np.nan if np.isnat(date) else date.item()
+        for date in (death_date[0], visit_end_datetime[0])
+    )
+
+
+def gen_end_datetimes(
+    study_start_date,
+    visit_start_datetime,
+    final_survival_ratio,
+    death_saturation_day,
+    care_site_id,
+    list_hospital_with_no_death=(),
+    rng=None,
+):
+    """
+    Draw visit_end_datetime for each visit (batch version of gen_end_datetime).
+
+    Death days are drawn by inverse-CDF sampling of the survival curve truncated to the stay window
+    (at most n_days_survival days and before study_start_date).
+
+    Parameters
+    ----------
+    study_start_date: datetime.date,
+        date at which visits are starting.
+    visit_start_datetime: np array of datetime64[D]
+    final_survival_ratio: float or np array of float,
+        final offset of the survival curve.
+    death_saturation_day: int or np array of int,
+        inflexion point of the survival curve.
+    care_site_id: np array of str
+    list_hospital_with_no_death: list[str],
+        list of hospital for which final_survival_ratio_loc is one (no death).
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    death_date: np array of datetime64[D] (NaT if no death)
+    visit_end_datetime: np array of datetime64[D] (NaT if unknown)
+    """
+    rng = check_rng(rng)
+    n_days_survival = load_conf()["max_stay_duration"]
+    n = len(visit_start_datetime)
+    study_start_date = np.datetime64(study_start_date, "D")
+    final_survival_ratio_loc = np.where(
+        np.isin(care_site_id, list(list_hospital_with_no_death)),
+        1.0,
+        final_survival_ratio,
+    )
+    death = rng.random(n) < 1 - final_survival_ratio_loc
+
+    death_date = np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+    max_days = np.minimum(
+        n_days_survival,
+        (study_start_date - visit_start_datetime[death]).astype(int),
+    )
+    death_date[death] = visit_start_datetime[death] + draw_survival_days(
+        final_survival_ratio_loc[death],
+        np.broadcast_to(death_saturation_day, n)[death],
+        np.maximum(max_days, 1),
+        rng,
+    )
+
+    stay_days = rng.integers(1, n_days_survival + 1, n)
+    visit_end_datetime = visit_start_datetime + stay_days
+    visit_end_datetime[visit_end_datetime >= study_start_date] = np.datetime64("NaT")
+    visit_end_datetime[death] = death_date[death]
 
     return death_date, visit_end_datetime
 
 
-def gen_birth_datetime(age, bad_age_proba, visit_start_datetime, random_date_age):
+def gen_birth_datetime(
+    age, bad_age_proba, visit_start_datetime, random_date_age, rng=None
+):
     """
     Draw birth_datetime.
 
@@ -206,22 +426,61 @@ def gen_birth_datetime(age, bad_age_proba, visit_start_datetime, random_date_age
         visit date
     random_date_age: datetime.date,
          flawed date.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     birth_datetime: datetime.datetime
     """
-    if np.random.random() < bad_age_proba:
+    rng = check_rng(rng)
+    if rng.random() < bad_age_proba:
         birth_datetime = random_date_age
     else:
         birth_datetime = draw_random_date(
             visit_start_datetime - relativedelta(years=age + 1),
             visit_start_datetime - relativedelta(years=age),
+            rng,
         )
     return birth_datetime
 
 
-def gen_source(source_list):
+def gen_birth_datetimes(
+    age, bad_age_proba, visit_start_datetime, random_date_age, rng=None
+):
+    """
+    Draw birth_datetime for each patient (batch version of gen_birth_datetime).
+
+    Parameters
+    ----------
+    age: np array of int,
+        age of the patients
+    bad_age_proba: float,
+        proba of replacing a relevant birth_datetime by a flawed random_date_age
+    visit_start_datetime: np array of datetime64[D],
+        visit dates
+    random_date_age: datetime.date,
+         flawed date.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    birth_datetime: np array of datetime64[D]
+    """
+    rng = check_rng(rng)
+    birth_datetime = draw_random_dates(
+        shift_years(visit_start_datetime, -(age + 1)),
+        shift_years(visit_start_datetime, -age),
+        rng=rng,
+    )
+    birth_datetime[rng.random(len(age)) < bad_age_proba] = np.datetime64(
+        random_date_age, "D"
+    )
+    return birth_datetime
+
+
+def gen_source(source_list, rng=None):
     """
     Draw EHR source (for the person).
 
@@ -229,20 +488,48 @@ def gen_source(source_list):
     ----------
     source_list: list[str],
         list of possible sources.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     source: str,
         EHR name.
     """
-    cat_source_list = [el[0] for el in source_list]
-    p_source_list = normalize(
-        np.array([el[1] for el in source_list]).reshape((1, -1)), "l1"
-    )[0]
-    person_source = np.random.choice(cat_source_list, 1, p=p_source_list)[0]
+    rng = check_rng(rng)
+    cat_source_list, p_source_list = _source_options(source_list)
+    person_source = rng.choice(cat_source_list, 1, p=p_source_list)[0]
     return person_source
 
-def duplicate_patient_visit(df_patient, df_visit, id_generator, duplication_ratio=0.3):
+
+def gen_sources(n, source_list, rng=None):
+    """
+    Draw n EHR sources at once (batch version of gen_source).
+
+    Parameters
+    ----------
+    n: int,
+        number of sources to draw.
+    source_list: list[str],
+        list of possible sources.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    source: np array of object,
+        EHR names.
+    """
+    rng = check_rng(rng)
+    cat_source_list, p_source_list = _source_options(source_list)
+    return np.asarray(cat_source_list, dtype=object)[
+        rng.choice(len(cat_source_list), n, p=p_source_list)
+    ]
+
+
+def duplicate_patient_visit(
+    df_patient, df_visit, id_generator, duplication_ratio=0.3, rng=None
+):
     """
     Transcode some 'person_id' of 'person' into a "df_dedup".
 
@@ -252,6 +539,8 @@ def duplicate_patient_visit(df_patient, df_visit, id_generator, duplication_rati
         "person" table.
     duplication_ratio: float (in [0,1]):
         ratio of patients with shifted id.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
@@ -260,24 +549,29 @@ def duplicate_patient_visit(df_patient, df_visit, id_generator, duplication_rati
     - df_dedup: pandas.df,
         person_id transcoding table (schema = ['person_id', 'unique_person_id'])
     """
-    df_dedup = (
-        df_patient.query("death_datetime != death_datetime")[["person_id"]]
-        .copy()
-        .rename(columns={"person_id": "unique_person_id"})
+    rng = check_rng(rng)
+    dead = df_patient["death_datetime"].notna().to_numpy()
+    alive_ids = df_patient["person_id"].to_numpy()[~dead]
+    duplicated = rng.random(len(alive_ids)) < duplication_ratio
+    n_duplicated = int(duplicated.sum())
+
+    # each duplicated patient is directly followed by its new id (as with an explode)
+    unique_person_id = np.repeat(alive_ids, 1 + duplicated)
+    person_id = unique_person_id.copy()
+    person_id[
+        np.flatnonzero(duplicated) + np.arange(1, n_duplicated + 1)
+    ] = id_generator.run_many("person_id", n_duplicated)
+    df_dedup = pd.DataFrame(
+        {"unique_person_id": unique_person_id, "person_id": person_id},
+        index=df_patient.index[~dead].repeat(1 + duplicated),
     )
     df_dedup_dead = (
-        df_patient.query("death_datetime == death_datetime")[["person_id"]]
+        df_patient.loc[dead, ["person_id"]]
         .copy()
         .rename(columns={"person_id": "unique_person_id"})
     )
     df_dedup_dead["person_id"] = df_dedup_dead["unique_person_id"]
 
-    df_dedup["person_id"] = df_dedup["unique_person_id"].apply(
-        lambda x: [x]
-        if np.random.random() >= duplication_ratio
-        else [x, id_generator.run("person_id")]
-    )
-    df_dedup = df_dedup.explode("person_id")
     df_dedup_all = pd.concat([df_dedup, df_dedup_dead])
 
     df_patient = (
@@ -296,13 +590,15 @@ def duplicate_patient_visit(df_patient, df_visit, id_generator, duplication_rati
         .drop(columns=["unique_person_id", "person_id_x"])
     )
 
-    df_visit["visit_occurrence_id"] = df_visit["visit_occurrence_id"].apply(
-        lambda x: id_generator.run("visit_occurrence_id")
+    df_visit["visit_occurrence_id"] = id_generator.run_many(
+        "visit_occurrence_id", len(df_visit)
     )
     return df_patient, df_visit, df_dedup
 
 
-def deduplicate_patient(df_person, df_dedup, transco, hard_sucess_ratio=0.3):
+def deduplicate_patient(
+    df_person, df_dedup, transco, hard_sucess_ratio=0.3, rng=None
+):
     """
     Parameters
     ----------
@@ -314,6 +610,8 @@ def deduplicate_patient(df_person, df_dedup, transco, hard_sucess_ratio=0.3):
         type of transcoding (hard or probabilistic)
     hard_sucess_ratio :float (in [0,1]):
         ratio of success of the determinist approach
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
@@ -325,11 +623,14 @@ def deduplicate_patient(df_person, df_dedup, transco, hard_sucess_ratio=0.3):
         (schema: [person_id', 'unique_person_id''prob'])
         None if transco=="hard".
     """
+    rng = check_rng(rng)
     df_dedup_unique = df_dedup[df_dedup["person_id"] != df_dedup["unique_person_id"]]
     df_dedup_hard, df_dedup_proba = None, None
     if transco is not None:
         if transco in ["hard", "probabilistic"]:
-            df_dedup_hard = df_dedup_unique.sample(frac=hard_sucess_ratio)
+            df_dedup_hard = df_dedup_unique.sample(
+                frac=hard_sucess_ratio, random_state=rng
+            )
             df_dedup_proba = df_dedup_hard.copy()
             df_dedup_proba["prob"] = 1
         if transco == "probabilistic":
@@ -339,32 +640,26 @@ def deduplicate_patient(df_person, df_dedup, transco, hard_sucess_ratio=0.3):
                 .sort_values("prob")
                 .drop_duplicates(["person_id", "unique_person_id"])
             )
-            df_dedup_proba["prob"] = df_dedup_proba["prob"].apply(
-                lambda x: x
-                if x == 1
-                else np.random.uniform(0.9, 1.0)
-                if np.random.random() <= 0.4
-                else np.random.uniform(0.0, 0.9)
+            df_dedup_proba["prob"] = np.where(
+                df_dedup_proba["prob"] == 1,
+                1,
+                draw_uniform_mixture(
+                    len(df_dedup_proba), [(0.4, (0.9, 1.0)), (0.6, (0.0, 0.9))], rng
+                ),
             )
             # We should also add patients that are not deplucates with score < 0.4
-            person_ids = df_person.person_id.unique().tolist()
-            np.random.shuffle(person_ids)
-            person_ids_1 = person_ids
-            np.random.shuffle(person_ids)
-            person_ids_2 = person_ids
-
-            df_dedup_proba_false = pd.DataFrame(
-                {"person_id": person_ids_1, "unique_person_id": person_ids_2}
-            )
-            df_dedup_proba_false["prob"] = 0
-            df_dedup_proba_false_sample = df_dedup_proba_false.sample(frac=0.1)
-            df_dedup_proba_false_sample["prob"] = df_dedup_proba_false_sample[
-                "prob"
-            ].apply(
-                lambda x: np.random.uniform(0, 0.2)
-                if np.random.random() <= 0.9
-                else np.random.uniform(0.2, 0.5)
-            )
+            # (10% of the patients, paired through two independent permutations)
+            person_ids = df_person.person_id.unique()
+            n_false = int(round(0.1 * len(person_ids)))
+            df_dedup_proba_false_sample = pd.DataFrame(
+                {
+                    "person_id": rng.permutation(person_ids)[:n_false],
+                    "unique_person_id": rng.permutation(person_ids)[:n_false],
+                    "prob": draw_uniform_mixture(
+                        n_false, [(0.9, (0.0, 0.2)), (0.1, (0.2, 0.5))], rng
+                    ),
+                }
+            ).query("person_id != unique_person_id")
             df_dedup_proba = pd.concat([df_dedup_proba, df_dedup_proba_false_sample])
             df_dedup_proba = df_dedup_proba.drop_duplicates(
                 ["person_id", "unique_person_id"]
@@ -384,20 +679,20 @@ def gen_admin_tables(
     source_list=tuple([("EHR 1", 1)]),
     censoring_ratio=None,
     death_saturation_day=15,
-    list_hospital=conf["list_hospital"],
+    list_hospital=None,
     hospital_proba=None,
     hospital_anomaly=(),
     final_survival_ratio=0.4,
     age_range_per_hospital=None,
-    study_start_date=datetime.date.fromisoformat(conf["t_end"]),
-    epidemic_duration_months=conf["epidemic_duration_months"],
-    random_date_visit=draw_random_date(
-        datetime.date(1800, 1, 1), datetime.date(1890, 1, 1)
-    ),
-    random_date_age=draw_random_date(
-        datetime.date(1800, 1, 1), datetime.date(1890, 1, 1)
-    ),
+    study_start_date=None,
+    epidemic_duration_months=None,
+    random_date_visit=None,
+    random_date_age=None,
     list_hospital_with_no_death=(),
+    epidemic_intensity=None,
+    batch=False,
+    n_patient=None,
+    rng=None,
 ):
     """
     Draw randdf_dedupom administrative data.
@@ -424,6 +719,8 @@ def gen_admin_tables(
         exp coeff in the exp infection curve (number of days at which the inflexion point occurs). If None, visit_start_date is drawn uniformly.
     :param death_saturation_day: int,
         exp coeff in the exp survival curve (number of days at which the inflexion point occurs)
+    :param list_hospital: list[str],
+        hospitals of the visits (conf.yaml list_hospital if None).
     :param hospital_anomaly: list of tuple (hospital name-str-, datetime.date, ),
          interval of dates at which the specified hospital has no death date recorded.
     :param final_survival_ratio: float (between 0 and 1),
@@ -431,15 +728,25 @@ def gen_admin_tables(
     :param age_range_per_hospital: dict,
         age_range tuple for each hospital id.
     :param study_start_date: datetime.date,
-        date from which start_datetime is drawn.
+        date from which start_datetime is drawn (conf.yaml t_end if None).
     :param epidemic_duration_months: int,
-        number àf months of the epidemic.
+        number àf months of the epidemic (conf.yaml epidemic_duration_months if None).
     :param random_date_visit: datetime.date,
-        random flowed data.
+        random flowed data (drawn between 1800 and 1890 if None).
     :param random_date_age: datetime.date,
-        random flowed data.
+        random flowed data (drawn between 1800 and 1890 if None).
     :param list_hospital_with_no_death: list[str],
         list of hospital for which final_survival_ratio_loc is one (no death).
+    :param epidemic_intensity: callable,
+        intensity of visits given the array of day numbers since the epidemic start (e.g. an epidemic curve).
+        If not None, it is used instead of censoring_ratio to draw visit_start_date.
+    :param batch: bool,
+        if True, each column is drawn at once as a numpy array instead of patient by patient
+        (same distributions, but not the same draws for a given seed).
+    :param n_patient: int,
+        number of patients. If not None, it is used instead of n (e.g. to draw a chunk of patients).
+    :param rng: np.random.Generator,
+        random generator (see check_rng).
 
     :return:
         - df_person: pandas df,
@@ -449,104 +756,176 @@ def gen_admin_tables(
         - df_dedup: pandas df,
             columns are 'person_id' and 'unique_person_id'. None if split_inter_annual_visit is False.
     """
-    (
-        list_person_id,
-        list_birth_datetime,
-        list_death_datetime,
-        list_gender_source_value,
-        list_cdm_source,
-    ) = ([], [], [], [], [])
-    (
-        list_visit_occurrence_id,
-        list_care_site_id,
-        list_visit_start_datetime,
-        list_visit_end_datetime,
-        list_person_id,
-        list_visit_source_value,
-    ) = ([], [], [], [], [], [])
-
-    n_patient = int(n * (age_range[1] - age_range[0]))
-
-    # plot survival curve
-    y_survival_curve, _, _ = survival_exp(
-        final_survival_ratio,
-        n_days=n_days_survival,
-        saturation=death_saturation_day,
-    )
-
-    for _ in range(n_patient):
-        # id
-        person_id = id_generator.run("person_id")
-        visit_occurrence_id = id_generator.run("visit_occurrence_id")
-
-        # gender
-        gender = gen_gender(gender_list, gender_noise, nan_age_proba)
-
-        #
-        visit_start_datetime = gen_visit_start_datetime(
-            study_start_date, epidemic_duration_months, censoring_ratio
+    rng = check_rng(rng)
+    conf = load_conf()
+    if list_hospital is None:
+        list_hospital = conf["list_hospital"]
+    if study_start_date is None:
+        study_start_date = datetime.date.fromisoformat(conf["t_end"])
+    if epidemic_duration_months is None:
+        epidemic_duration_months = conf["epidemic_duration_months"]
+    if n_patient is None:
+        n_patient = int(n * (age_range[1] - age_range[0]))
+    if random_date_visit is None:
+        random_date_visit = draw_random_date(
+            datetime.date(1800, 1, 1), datetime.date(1890, 1, 1), rng
         )
-
-        # constant
-        visit_source_value = "Hospitalisés"
-        age = np.random.randint(*age_range)
-        care_site_id = gen_care_site_id(
-            list_hospital, hospital_proba, age_range_per_hospital, age
+    if random_date_age is None:
+        random_date_age = draw_random_date(
+            datetime.date(1800, 1, 1), datetime.date(1890, 1, 1), rng
         )
 
-        ##############
-        death_date, visit_end_datetime = gen_end_datetime(
+    if batch:
+        person_id = id_generator.run_many("person_id", n_patient)
+        visit_occurrence_id = id_generator.run_many("visit_occurrence_id", n_patient)
+        gender = gen_genders(
+            n_patient, gender_list, gender_noise, nan_age_proba, rng
+        )
+        visit_start_datetime = gen_visit_start_datetimes(
+            n_patient,
+            study_start_date,
+            epidemic_duration_months,
+            censoring_ratio,
+            epidemic_intensity,
+            rng,
+        )
+        age = rng.integers(*age_range, size=n_patient)
+        care_site_id = gen_care_site_ids(
+            age, list_hospital, hospital_proba, age_range_per_hospital, rng
+        )
+        death_date, visit_end_datetime = gen_end_datetimes(
             study_start_date,
             visit_start_datetime,
             final_survival_ratio,
-            y_survival_curve,
+            death_saturation_day,
             care_site_id,
             list_hospital_with_no_death,
+            rng,
+        )
+        birth_datetime = gen_birth_datetimes(
+            age, bad_age_proba, visit_start_datetime, random_date_age, rng
+        )
+        visit_start_datetime[
+            rng.random(n_patient) < bad_visit_date_proba
+        ] = np.datetime64(random_date_visit, "D")
+        person_source = gen_sources(n_patient, source_list, rng)
+        birth_datetime[person_source == "EHR 2"] = np.datetime64("NaT")
+
+        df_person = pd.DataFrame(
+            {
+                "person_id": person_id,
+                "birth_datetime": birth_datetime,
+                "death_datetime": death_date,
+                "gender_source_value": gender,
+                "cdm_source": person_source,
+            }
         )
 
-        # birth
-        birth_datetime = gen_birth_datetime(
-            age, bad_age_proba, visit_start_datetime, random_date_age
+        df_visit = pd.DataFrame(
+            {
+                "visit_occurrence_id": visit_occurrence_id,
+                "care_site_id": care_site_id,
+                "visit_start_datetime": visit_start_datetime,
+                "visit_end_datetime": visit_end_datetime,
+                "person_id": person_id,
+                "visit_source_value": "Hospitalisés",
+            }
         )
-        if np.random.random() < bad_visit_date_proba:
-            visit_start_datetime = random_date_visit
-
-        # source
-        person_source = gen_source(source_list)
-        if person_source == "EHR 2":
-            birth_datetime = np.nan
-
-        list_person_id.append(person_id)
-        list_birth_datetime.append(birth_datetime)
-        list_death_datetime.append(death_date)
-        list_gender_source_value.append(gender)
-        list_cdm_source.append(person_source)
-        list_visit_occurrence_id.append(visit_occurrence_id)
-        list_care_site_id.append(care_site_id)
-        list_visit_start_datetime.append(visit_start_datetime)
-        list_visit_end_datetime.append(visit_end_datetime)
-        list_visit_source_value.append(visit_source_value)
-
-    df_person = pd.DataFrame(
-        {
-            "person_id": list_person_id,
-            "birth_datetime": list_birth_datetime,
-            "death_datetime": list_death_datetime,
-            "gender_source_value": list_gender_source_value,
-            "cdm_source": list_cdm_source,
-        }
-    )
+    else:
+        (
+            list_person_id,
+            list_birth_datetime,
+            list_death_datetime,
+            list_gender_source_value,
+            list_cdm_source,
+        ) = ([], [], [], [], [])
+        (
+            list_visit_occurrence_id,
+            list_care_site_id,
+            list_visit_start_datetime,
+            list_visit_end_datetime,
+            list_person_id,
+            list_visit_source_value,
+        ) = ([], [], [], [], [], [])
+
+        for _ in range(n_patient):
+            # id
+            person_id = id_generator.run("person_id")
+            visit_occurrence_id = id_generator.run("visit_occurrence_id")
+
+            # gender
+            gender = gen_gender(gender_list, gender_noise, nan_age_proba, rng)
+
+            #
+            visit_start_datetime = gen_visit_start_datetime(
+                study_start_date,
+                epidemic_duration_months,
+                censoring_ratio,
+                epidemic_intensity,
+                rng,
+            )
 
-    df_visit = pd.DataFrame(
-        {
-            "visit_occurrence_id": list_visit_occurrence_id,
-            "care_site_id": list_care_site_id,
-            "visit_start_datetime": list_visit_start_datetime,
-            "visit_end_datetime": list_visit_end_datetime,
-            "person_id": list_person_id,
-            "visit_source_value": list_visit_source_value,
-        }
-    )
+            # constant
+            visit_source_value = "Hospitalisés"
+            age = int(rng.integers(*age_range))
+            care_site_id = gen_care_site_id(
+                list_hospital, hospital_proba, age_range_per_hospital, age, rng
+            )
+
+            ##############
+            death_date, visit_end_datetime = gen_end_datetime(
+                study_start_date,
+                visit_start_datetime,
+                final_survival_ratio,
+                death_saturation_day,
+                care_site_id,
+                list_hospital_with_no_death,
+                rng,
+            )
+
+            # birth
+            birth_datetime = gen_birth_datetime(
+                age, bad_age_proba, visit_start_datetime, random_date_age, rng
+            )
+            if rng.random() < bad_visit_date_proba:
+                visit_start_datetime = random_date_visit
+
+            # source
+            person_source = gen_source(source_list, rng)
+            if person_source == "EHR 2":
+                birth_datetime = np.nan
+
+            list_person_id.append(person_id)
+            list_birth_datetime.append(birth_datetime)
+            list_death_datetime.append(death_date)
+            list_gender_source_value.append(gender)
+            list_cdm_source.append(person_source)
+            list_visit_occurrence_id.append(visit_occurrence_id)
+            list_care_site_id.append(care_site_id)
+            list_visit_start_datetime.append(visit_start_datetime)
+            list_visit_end_datetime.append(visit_end_datetime)
+            list_visit_source_value.append(visit_source_value)
+
+        df_person = pd.DataFrame(
+            {
+                "person_id": list_person_id,
+                "birth_datetime": list_birth_datetime,
+                "death_datetime": list_death_datetime,
+                "gender_source_value": list_gender_source_value,
+                "cdm_source": list_cdm_source,
+            }
+        )
+
+        df_visit = pd.DataFrame(
+            {
+                "visit_occurrence_id": list_visit_occurrence_id,
+                "care_site_id": list_care_site_id,
+                "visit_start_datetime": list_visit_start_datetime,
+                "visit_end_datetime": list_visit_end_datetime,
+                "person_id": list_person_id,
+                "visit_source_value": list_visit_source_value,
+            }
+        )
 
     df_person = apply_hosp_anomaly(
         df_person.merge(
@@ -566,7 +945,7 @@ def gen_admin_tables(
     df_visit["visit_end_datetime"] = pd.to_datetime(df_visit["visit_end_datetime"])
 
     # Shuffle dataframe to reset order
-    df_person = df_person.sample(frac=1).reset_index(drop=True)
-    df_visit = df_visit.sample(frac=1).reset_index(drop=True)
+    df_person = df_person.sample(frac=1, random_state=rng).reset_index(drop=True)
+    df_visit = df_visit.sample(frac=1, random_state=rng).reset_index(drop=True)
 
     return df_person, df_visit
@@ -1,10 +1,11 @@
-import numpy as np
 import pandas as pd
+from .utils import *
 
 
 def normal_drawing(mu, sigma):
-    def f(row):
-        return np.random.normal(mu, sigma)
+    @frame_drawing
+    def f(df, rng):
+        return rng.normal(mu, sigma, len(df))
     return f
 
 
@@ -14,6 +15,7 @@ def gen_bio_table(
     df_person=None,
     df_med=None,
     list_measurement=[('bmi', 'kg.cm^-2', 0.7, normal_drawing(25, 3))],
+    rng=None,
 ):
     """
     Draw bio measurement table, based on given visits, bio concepts and their assignment functions.
@@ -31,13 +33,17 @@ def gen_bio_table(
         - bio_concept: str, name of the biological concept measured
         - unit: unit of the measurement
         - ratio: ratio of kept values (i.e 1-pct_missing)
-        - drawing_func : function callable on rows to assign biological values given the wanted conditions. Normal drawing by default.
+        - drawing_func : function callable on rows to assign biological values given the wanted conditions, or
+          frame-level function (see frame_drawing) returning the values of a whole frame. Normal drawing by default.
+    :param rng: Optional(np.random.Generator)
+        Random generator (see check_rng), also given to frame-level drawing functions.
 
     Returns
     -------
     :param df_bio: pandas.df
         DataFrame gathering the biological values associated to the input visits.
     """
+    rng = check_rng(rng)
     df_bio = df_visit[
         ["visit_occurrence_id", "visit_start_datetime", "person_id"]
     ].rename(columns={"visit_start_datetime": "measurement_datetime"})
@@ -60,15 +66,15 @@ def gen_bio_table(
 
     df_bio_all = []
     for bio_concept, unit, ratio, drawing_func in list_measurement:
+        drawing_func = as_frame_drawing(drawing_func)
         df_bio_all.append(
             df_bio.assign(
-                measurement_id=lambda pp: pp['visit_occurrence_id'].apply(
-                    lambda x: id_generator.run('measurement_id')),
+                measurement_id=lambda pp: id_generator.run_many('measurement_id', len(pp)),
                 concept_source_value=lambda pp: bio_concept,
-                transformed_value=lambda pp: pp.apply(drawing_func, axis=1),
+                transformed_value=lambda pp: drawing_func(pp, rng),
                 transformed_unit=lambda pp: unit
             )
-            .sample(frac=ratio)
+            .sample(frac=ratio, random_state=rng)
         )
     df_bio_all = pd.concat(df_bio_all, axis=0)
 
@@ -78,6 +84,6 @@ def gen_bio_table(
     ]
 
     # Shuffle dataframe to reset order
-    df_bio_all = df_bio_all.sample(frac=1).reset_index(drop=True)
+    df_bio_all = df_bio_all.sample(frac=1, random_state=rng).reset_index(drop=True)
 
     return df_bio_all
@@ -0,0 +1,229 @@
+import datetime
+import functools
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .writer import read_table, write_tables
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+# Files read by the generators: datasets are drawn again when they change
+CONF_FILES = [
+    os.path.join(dir_path, "..", "conf.yaml"),
+    os.path.join(dir_path, "..", "config", "config_ex4.csv"),
+]
+ENTRY_FILE = "entry.json"
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """
+    Hash of the source code of the pipelines (data_generator/pipelines/*.py).
+
+    :return: str, sha256 hex digest
+    """
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(dir_path)):
+        if name.endswith(".py"):
+            h.update(name.encode())
+            with open(os.path.join(dir_path, name), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+def _json_default(obj):
+    # Dates are hashed with their ISO format, other objects are not hashed (their repr may contain addresses)
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    raise AttributeError(
+        f"{obj!r} ({type(obj).__name__}) cannot be hashed in a cache key, use JSON-serializable parameters"
+    )
+
+
+def cache_key(params=None, files=()):
+    """
+    Key of a generated dataset: sha256 of its parameters (e.g. a scenario, with its seed), of the content
+    of the files it depends on (e.g. the exercise script), of CONF_FILES, of the code of the pipelines and
+    of the versions of numpy (draws) and pandas (pickles).
+
+    :param params: JSON-serializable parameters (dates are hashed with their ISO format)
+    :param files: list of str, paths of other files the dataset depends on
+    :return: str, sha256 hex digest
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(params, sort_keys=True, default=_json_default).encode())
+    for file in CONF_FILES + list(files):
+        h.update(os.path.basename(file).encode())
+        if os.path.exists(file):
+            with open(file, "rb") as f:
+                h.update(f.read())
+    h.update(code_version().encode())
+    h.update(f"numpy {np.__version__} pandas {pd.__version__}".encode())
+    return h.hexdigest()
+
+
+def _size(path):
+    # Size of the files of a directory (bytes)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def _link(source, target, symlink):
+    # Link (or copy) a file, replacing target
+    if os.path.lexists(target):
+        os.remove(target)
+    if symlink:
+        os.symlink(os.path.abspath(source), target)
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        # e.g. the cache and the target are not on the same filesystem
+        shutil.copy2(source, target)
+
+
+class DatasetCache:
+    """
+    Content-addressed cache of generated tables (see cache_key).
+
+    Each entry is a directory written by write_tables, named after the key and the format. Entries are
+    linked to the output directories (hard links, copies if the cache is on another filesystem) and the
+    least recently used ones are removed once the cache is larger than max_size.
+
+    Parameters
+    ----------
+    path: str (default None),
+        directory of the cache. If None, $EDS_TUTORIAL_CACHE or ~/.cache/eds-tutorial.
+    max_size: int (default 2 GiB),
+        size budget of the cache (bytes).
+    """
+
+    def __init__(self, path=None, max_size=2 * 1024 ** 3):
+        if path is None:
+            path = os.environ.get(
+                "EDS_TUTORIAL_CACHE",
+                os.path.join(os.path.expanduser("~"), ".cache", "eds-tutorial"),
+            )
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    def entry(self, key, generate, format="pickle", compact=False):
+        """
+        Return the entry of a dataset, writing the tables of generate() on a miss.
+
+        :param key: str, key of the dataset (see cache_key)
+        :param generate: function, generate() returns the tables of the dataset (name -> pandas.df)
+        :param format: str, format of the tables (see write_tables)
+        :param compact: bool, if True, tables are written with a compact schema (see compact_table)
+        :return: (str, bool), directory of the entry and True on a hit
+        """
+        entry = os.path.join(
+            self.path, f"{key}.{format}" + (".compact" if compact else "")
+        )
+        if os.path.exists(os.path.join(entry, ENTRY_FILE)):
+            # the modification time orders entries for eviction
+            os.utime(entry)
+            return entry, True
+
+        tables = generate()
+        tmp = f"{entry}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        write_tables(tables, tmp, format=format, compact=compact)
+        with open(os.path.join(tmp, ENTRY_FILE), "w") as f:
+            json.dump({"format": format, "tables": list(tables)}, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # written meanwhile by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=entry)
+        return entry, False
+
+    def link(self, entry, path, symlink=False):
+        """
+        Link the files of an entry to an output directory (existing files are replaced).
+
+        :param entry: str, directory of the entry (see entry)
+        :param path: str, output directory
+        :param symlink: bool, if True, files are symbolic links (broken once the entry is evicted)
+        """
+        for root, _, names in os.walk(entry):
+            target_dir = os.path.join(path, os.path.relpath(root, entry))
+            os.makedirs(target_dir, exist_ok=True)
+            for name in names:
+                if name != ENTRY_FILE:
+                    _link(
+                        os.path.join(root, name),
+                        os.path.join(target_dir, name),
+                        symlink,
+                    )
+
+    @staticmethod
+    def load(entry):
+        """
+        Read the tables of an entry.
+
+        :param entry: str, directory of the entry (see entry)
+        :return: dict, tables (name -> pandas.df)
+        """
+        with open(os.path.join(entry, ENTRY_FILE)) as f:
+            info = json.load(f)
+        if info["format"] == "pickle":
+            return {
+                name: pd.read_pickle(os.path.join(entry, f"df_{name}.pkl"))
+                for name in info["tables"]
+            }
+        return {name: read_table(entry, name) for name in info["tables"]}
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits in max_size.
+
+        :param keep: str, directory of an entry that is not removed
+        """
+        entries = sorted(
+            (
+                os.path.join(self.path, name)
+                for name in os.listdir(self.path)
+                if ".tmp-" not in name
+            ),
+            key=os.path.getmtime,
+        )
+        sizes = {entry: _size(entry) for entry in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            if entry != keep:
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= sizes[entry]
+
+
+def cached_write_tables(
+    generate, path, key, format="pickle", compact=False, cache=None
+):
+    """
+    Write tables to a directory, drawing them only if they are not in the cache.
+
+    :param generate: function, generate() returns the tables (name -> pandas.df)
+    :param path: str, output directory
+    :param key: str, key of the tables (see cache_key)
+    :param format: str, output format (see write_tables)
+    :param compact: bool, if True, tables are written with a compact schema (see compact_table)
+    :param cache: DatasetCache, a DatasetCache() if None
+    :return: bool, True if the tables were in the cache
+    """
+    cache = DatasetCache() if cache is None else cache
+    entry, hit = cache.entry(key, generate, format=format, compact=compact)
+    cache.link(entry, path)
+    return hit
@@ -1,22 +1,133 @@
 import datetime
 import pandas as pd
 import numpy as np
-import yaml
-import os
 from .utils import *
 
 
-dir_path = os.path.dirname(os.path.realpath(__file__))
-conf = yaml.safe_load(open(os.path.join(dir_path, "..", "conf.yaml")))
-
-
 def uniform_drawing(p):
-    def f(row):
-        return np.random.uniform() < p
+    """
+    Frame-level drawing keeping each row with probability p. As it does not depend on the rows, p is exposed
+    (as f.bernoulli_p) so that kept rows can be drawn without evaluating each row.
+    """
+
+    @frame_drawing
+    def f(df, rng):
+        return rng.random(len(df)) < p
 
+    f.bernoulli_p = p
     return f
 
-def apply_error_per_hosp(df_cond, code_error_per_hospital, list_random_cim10):
+
+def _code_distribution(list_codes):
+    # uniform distribution over list_codes (a code listed twice is twice as likely)
+    code_distribution = {}
+    for code in list_codes:
+        code_distribution[code] = code_distribution.get(code, 0) + 1
+    return code_distribution
+
+
+def default_cim10_schedule(list_good_cim10):
+    """
+    Chronological schedule of cim10 codes: the first one until 2024-11-01, then the intermediate ones in turn
+    (starting at evenly spaced dates between 2024-11-01 and 2025-02-01) and finally a linear transition to
+    the last one from 2025-02-01 until 2025-08-01. With 2 codes, the first one is used until 2025-02-01, then
+    the transition starts. With 3 codes, the second one is used from 2024-11-01 to 2025-02-01.
+
+    A step applies to the dates strictly after its start date (see draw_scheduled_codes): on a boundary day
+    (e.g. 2024-11-01), the code of the previous step is drawn.
+
+    Parameters
+    ----------
+    list_good_cim10: list[str],
+        list of cim10 codes, in chronological order.
+
+    Returns
+    -------
+    cim10_schedule: list,
+        schedule usable by draw_scheduled_codes.
+    """
+    if len(list_good_cim10) == 0:
+        raise AttributeError("list_good_cim10 must contain at least one cim10 code")
+    first_date, last_date = datetime.date(2024, 11, 1), datetime.date(2025, 2, 1)
+    n_intermediate = len(list_good_cim10) - 2
+    cim10_schedule = [(None, {list_good_cim10[0]: 1}, 0)]
+    for i, code in enumerate(list_good_cim10[1:-1]):
+        start_date = first_date + datetime.timedelta(
+            days=(last_date - first_date).days * i // n_intermediate
+        )
+        cim10_schedule.append((start_date, {code: 1}, 0))
+    if len(list_good_cim10) > 1:
+        cim10_schedule.append(
+            (
+                last_date,
+                {list_good_cim10[-1]: 1},
+                (datetime.date(2025, 8, 1) - last_date).days,
+            )
+        )
+    return cim10_schedule
+
+
+def draw_scheduled_codes(dates, code_schedule, rng=None):
+    """
+    Draw a code for each date following a chronological schedule of code distributions.
+
+    Parameters
+    ----------
+    dates: pandas.Series,
+        dates at which codes are drawn.
+    code_schedule: list,
+        list of steps (start_date, code_distribution, transition_days), sorted by start_date:
+        - start_date: datetime.date, the step applies to dates after start_date (None for the first step)
+        - code_distribution: dict, weight of each code
+        - transition_days: int, number of days over which the distribution moves linearly from the one of the
+          previous step to code_distribution (0 for an abrupt change)
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    codes: np array of object
+    """
+    rng = check_rng(rng)
+    codes = list(
+        dict.fromkeys(code for _, distribution, _ in code_schedule for code in distribution)
+    )
+    p_codes = np.array(
+        [
+            [distribution.get(code, 0) for code in codes]
+            for _, distribution, _ in code_schedule
+        ],
+        dtype=float,
+    )
+    p_codes /= p_codes.sum(axis=1, keepdims=True)
+    start_days = np.array(
+        [np.datetime64(start_date, "D") for start_date, _, _ in code_schedule],
+        dtype="datetime64[D]",
+    )
+    transition_days = np.array([step[2] for step in code_schedule], dtype=float)
+
+    days = pd.to_datetime(dates).values.astype("datetime64[D]")
+    step = np.searchsorted(start_days[1:], days, side="left")
+    previous_step = np.maximum(step - 1, 0)
+    # weight of the current step (vs the previous one) in the transition window
+    transition = np.ones(len(days))
+    in_transition = (step > 0) & (transition_days[step] > 0)
+    transition[in_transition] = np.clip(
+        (days - start_days[step])[in_transition].astype(float)
+        / transition_days[step][in_transition],
+        0,
+        1,
+    )
+    p_rows = (1 - transition[:, None]) * p_codes[previous_step] + transition[
+        :, None
+    ] * p_codes[step]
+
+    # one categorical draw for all rows
+    i_code = (p_rows.cumsum(axis=1) < rng.random(len(days))[:, None]).sum(axis=1)
+    return np.asarray(codes, dtype=object)[np.minimum(i_code, len(codes) - 1)]
+
+
+def apply_error_per_hosp(df_cond, code_error_per_hospital, list_random_cim10, rng=None):
     """
     Flaw "condition_source_value" column in df_cond.
 
@@ -28,31 +139,26 @@ def apply_error_per_hosp(df_cond, code_error_per_hospital, list_random_cim10):
         proba of miscoding for each hospital_id.
     list_random_cim10: list[str],
         list of flawed cim10.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     df_cond: pandas.df,
         flawed condition_occurrence table.
     """
+    rng = check_rng(rng)
     if code_error_per_hospital != 0:
-        df_cond = df_cond.assign(
-            condition_source_value=lambda pp: pp.apply(
-                lambda row: np.random.choice(
-                    [
-                        row["condition_source_value"],
-                        np.random.choice(list_random_cim10, 1)[0],
-                    ],
-                    1,
-                    p=[
-                        1 - code_error_per_hospital[row["care_site_id"]],
-                        code_error_per_hospital[row["care_site_id"]],
-                    ],
-                )[0]
-                if row["care_site_id"] in code_error_per_hospital
-                else row["condition_source_value"],
-                axis=1,
-            ).drop(columns=["care_site_id"])
+        # one uniform per row against the error probability of its hospital
+        error = (
+            rng.random(len(df_cond))
+            < df_cond["care_site_id"].map(code_error_per_hospital).fillna(0).values
+        )
+        condition_source_value = df_cond["condition_source_value"].to_numpy(
+            dtype=object, copy=True
         )
+        condition_source_value[error] = rng.choice(list_random_cim10, error.sum())
+        df_cond = df_cond.assign(condition_source_value=condition_source_value)
     return df_cond
 
 
@@ -65,6 +171,8 @@ def gen_condition_table(
     progressive_cim10=True,
     timeliness_date_per_hospital=None,
     code_error_per_hospital=0,
+    cim10_schedule=None,
+    rng=None,
 ):
     """
     Generate condition (diagnosis) data.
@@ -85,48 +193,39 @@ def gen_condition_table(
         date until which data if not made available.
     :param code_error_per_hospital: float,
         probability at which replacing meaningful CIM10 by random CIM10.
-
+    :param cim10_schedule: list,
+        chronological schedule of the cim10 codes (see draw_scheduled_codes). If given, list_good_cim10 and
+        progressive_cim10 are ignored.
+    :param rng: np.random.Generator,
+        random generator (see check_rng).
 
     :return: df_cond, pandas df,
         minimal "condition_occurrence" table (OMOP schema)
     """
+    rng = check_rng(rng)
 
-    list_random_cim10 = conf["list_random_cim10"]
+    list_random_cim10 = load_conf()["list_random_cim10"]
     df_cond = df_visit.drop_duplicates()[
         ["visit_occurrence_id", "person_id", "visit_start_datetime", "care_site_id"]
     ].rename(columns={"visit_start_datetime": "condition_start_datetime"})
 
-    def gen_condition(date):
+    if cim10_schedule is None:
         if progressive_cim10:
-            if len(list_good_cim10) != 3:
-                # @todo: cannot handled more thant 3 progressive cim10 !!!
-                raise NotImplementedError(
-                    "A list of more than 3 progressive cim10 is not handled yet"
-                )
-            if date <= pd.Timestamp(2024, 11, 1):
-                return list_good_cim10[0]
-            elif date <= pd.Timestamp(2025, 2, 1):
-                return list_good_cim10[1]
-            elif date <= pd.Timestamp(2025, 8, 1):
-                start_date, end_date = pd.to_datetime(datetime.date(2025, 2, 1)), date
-                max_days = (datetime.date(2025, 8, 1) - datetime.date(2025, 2, 1)).days
-                num_days = (end_date - start_date).days / max_days
-                p = num_days / max_days
-                return np.random.choice(list_good_cim10[-2:], 1, p=[1 - p, p])[0]
-            else:
-                return list_good_cim10[-1]
+            cim10_schedule = default_cim10_schedule(list_good_cim10)
         else:
-            return np.random.choice(list_good_cim10, 1)[0]
+            cim10_schedule = [(None, _code_distribution(list_good_cim10), 0)]
 
     df_cond = df_cond.assign(
-        condition_occurrence_id=lambda pp: [
-            id_generator.run("condition_occurrence_id") for _ in range(len(df_cond))
-        ],
-        condition_source_value=lambda pp: pp.condition_start_datetime.apply(
-            lambda x: gen_condition(x)
+        condition_occurrence_id=lambda pp: id_generator.run_many(
+            "condition_occurrence_id", len(pp)
+        ),
+        condition_source_value=lambda pp: draw_scheduled_codes(
+            pp["condition_start_datetime"], cim10_schedule, rng
         ),
     )
-    df_cond = apply_error_per_hosp(df_cond, code_error_per_hospital, list_random_cim10)
+    df_cond = apply_error_per_hosp(
+        df_cond, code_error_per_hospital, list_random_cim10, rng
+    )
 
     df_cond = apply_hosp_anomaly(
         df_cond, "condition_start_datetime", "condition_source_value", hospital_anomaly
@@ -134,7 +233,7 @@ def gen_condition_table(
 
     if deployment_date_per_hospital:
         df_cond = apply_deployment_per_hosp(
-            df_cond, df_visit, deployment_date_per_hospital
+            df_cond, df_visit, deployment_date_per_hospital, rng
         )
 
     if timeliness_date_per_hospital:
@@ -153,9 +252,10 @@ def gen_comorb_table(
     df_person=None,
     df_med=None,
     list_comorb=[(["code1"], 1, uniform_drawing(0.3))],
+    rng=None,
 ):
     """
-    Draw bio measurement table, based on given visits, bio concepts and their assignment functions.
+    Draw comorbidity conditions, based on given visits, comorbidity codes and their assignment functions.
 
     Parameters
     ----------
@@ -165,18 +265,22 @@ def gen_comorb_table(
         Dataframe containing patient information, may be used for value assignment. Optional.
     :param df_med: Optional(pandas.df)
         Dataframe containing drug information, may be used for value assignment. Optional.
-    :param list_measurement: list,
-        List of tuple (bio_concept, unit, ratio, drawing_func)
-        - bio_concept: str, name of the biological concept measured
-        - unit: unit of the measurement
-        - ratio: ratio of kept values (i.e 1-pct_missing)
-        - drawing_func : function callable on rows to assign biological values given the wanted conditions. Normal drawing by default.
+    :param list_comorb: list,
+        List of tuple (list_codes, ratio, drawing_func)
+        - list_codes: list[str], cim10 codes of the comorbidity
+        - ratio: ratio of kept occurrences (i.e 1-pct_missing)
+        - drawing_func : function callable on rows returning True for visits with the comorbidity, or
+          frame-level function (see frame_drawing) returning these booleans for a whole frame.
+          Uniform drawing by default.
+    :param rng: np.random.Generator,
+        random generator (see check_rng), also given to frame-level drawing functions.
 
     Returns
     -------
-    :param df_bio: pandas.df
-        DataFrame gathering the biological values associated to the input visits.
+    :param df_comorb: pandas.df
+        condition_occurrence rows of the comorbidities associated to the input visits.
     """
+    rng = check_rng(rng)
     df_comorb = df_visit.drop_duplicates()[
         ["visit_occurrence_id", "person_id", "visit_start_datetime"]
     ].rename(columns={"visit_start_datetime": "condition_start_datetime"})
@@ -193,20 +297,26 @@ def gen_comorb_table(
         )
 
     df_comorb_all = []
-    # Artificially creates the code for every patient, and modify the `transformed_value` only for kept occurrences
+    # Only kept occurrences are materialized (and get an id)
     # The `drawing func` must return a bool, True for kept occurrences
     for list_codes, ratio, drawing_func in list_comorb:
+        if hasattr(drawing_func, "bernoulli_p"):
+            # row-independent drawing: the number of kept rows is binomial, then rows are sampled
+            n_kept = rng.binomial(len(df_comorb), drawing_func.bernoulli_p)
+            n_kept = int(round(ratio * n_kept))
+            kept = np.sort(rng.choice(len(df_comorb), n_kept, replace=False))
+        else:
+            kept = np.flatnonzero(as_frame_drawing(drawing_func)(df_comorb, rng))
+            kept = np.sort(
+                rng.choice(kept, int(round(ratio * len(kept))), replace=False)
+            )
         df_comorb_all.append(
-            df_comorb.assign(
-                condition_occurrence_id=lambda pp: pp["visit_occurrence_id"].apply(
-                    lambda x: id_generator.run("condition_occurrence_id")
+            df_comorb.iloc[kept][["visit_occurrence_id", "person_id"]].assign(
+                condition_occurrence_id=lambda pp: id_generator.run_many(
+                    "condition_occurrence_id", len(pp)
                 ),
-                condition_source_value=lambda pp: np.random.choice(list_codes, 1)[0],
-                transformed_value=lambda pp: pp.apply(drawing_func, axis=1),
+                condition_source_value=rng.choice(list_codes, 1)[0],
             )
-            .query("transformed_value==True")
-            .drop(columns=["transformed_value"])
-            .sample(frac=ratio)
         )
     df_comorb_all = pd.concat(df_comorb_all, axis=0)
 
@@ -220,6 +330,8 @@ def gen_comorb_table(
     ]
 
     # Shuffle dataframe to reset order
-    df_comorb_all = df_comorb_all.sample(frac=1).reset_index(drop=True)
+    df_comorb_all = df_comorb_all.sample(frac=1, random_state=rng).reset_index(
+        drop=True
+    )
 
     return df_comorb_all
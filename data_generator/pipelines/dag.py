@@ -0,0 +1,302 @@
+import inspect
+import json
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from .cache import _json_default, cache_key
+from .runner import run_strata
+from .utils import idGenerator
+from .writer import write_tables
+
+
+def _run_node(node_stratum, id_generator):
+    # Run a node on one stratum (see TableDAG.add)
+    func, stratum, tables, params = node_stratum
+    return func(stratum, tables, id_generator, **params)
+
+
+def _source(func):
+    # Source code of a function (its name if not available, e.g. for builtins)
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return getattr(func, "__qualname__", repr(func))
+
+
+def _code_names(code):
+    # Global names used by a code object and by the functions defined in it
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _module(obj):
+    # Name of the module defining obj
+    return getattr(obj, "__module__", None) or ""
+
+
+def _dependencies(func, dependencies=None):
+    """
+    Source of a function, of the functions and classes of its package it uses (recursively) and the
+    JSON-serializable module-level values they use (other values, e.g. tables read from files, are not
+    hashed: the files must be declared).
+
+    :param func: function
+    :param dependencies: dict, dependencies already collected (updated)
+    :return: dict, source or value of each dependency (qualified name -> str)
+    """
+    if dependencies is None:
+        dependencies = {}
+    package = _module(func).split(".")[0]
+    dependencies[f"{_module(func)}.{func.__qualname__}"] = _source(func)
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return dependencies
+    for name in sorted(_code_names(code)):
+        if name not in func.__globals__:
+            continue
+        value = func.__globals__[name]
+        key = f"{_module(func)}.{name}"
+        if inspect.isfunction(value) or inspect.isclass(value):
+            qualified = f"{_module(value)}.{value.__qualname__}"
+            if (
+                qualified not in dependencies
+                and _module(value).split(".")[0] == package
+            ):
+                if inspect.isfunction(value):
+                    _dependencies(value, dependencies)
+                else:
+                    dependencies[qualified] = _source(value)
+        elif not inspect.ismodule(value) and key not in dependencies:
+            try:
+                dependencies[key] = json.dumps(
+                    value, sort_keys=True, default=_json_default
+                )
+            except (AttributeError, TypeError, ValueError):
+                pass
+    return dependencies
+
+
+class TableDAG:
+    """
+    Stratified pipeline with explicit dependencies between tables.
+
+    Each node draws some tables of every stratum from the tables of its upstream nodes. Its fingerprint
+    hashes the source of its function and of the functions of its package it calls (with the module-level
+    values they use), its parameters and files, the strata, the seed, the code of the pipelines and the
+    fingerprints of its upstream nodes (see cache_key): after a change, only the nodes whose fingerprint
+    changed are drawn again, the other ones are read from the store.
+
+    Each node gets its own seed (from the seed of the DAG and its name) and its own id generator (the
+    node_index-th of max_nodes children of id_generator), so that its tables do not depend on which
+    nodes are drawn again.
+
+    Parameters
+    ----------
+    strata: list,
+        parameters of each stratum, passed to the nodes.
+    seed: int,
+        seed of the DAG.
+    store: DatasetCache (default None),
+        store of the tables of the nodes. If None, all nodes are drawn at each run.
+    id_generator: idGenerator (default None),
+        generator split between nodes. If None, an idGenerator seeded by seed.
+    n_jobs: int (default 1),
+        number of processes (see run_strata).
+    max_nodes: int (default 16),
+        maximum number of nodes (ids are split between max_nodes nodes).
+    """
+
+    def __init__(
+        self, strata, seed, store=None, id_generator=None, n_jobs=1, max_nodes=16
+    ):
+        self.strata = list(strata)
+        self.seed = seed
+        self.store = store
+        self.n_jobs = n_jobs
+        self.max_nodes = max_nodes
+        if id_generator is None:
+            id_generator = idGenerator(seed=seed)
+        self.id_generators = id_generator.spawn(max_nodes)
+        self.nodes = {}
+        self.producers = {}
+        self.drawn = []
+
+    def add(self, name, func, outputs, inputs=(), params=None, files=()):
+        """
+        Add a node.
+
+        :param name: str, name of the node
+        :param func: function, func(stratum, tables, id_generator, **params) returns a dict of tables
+            (name -> pandas.df) of a stratum, from the tables of the stratum of the upstream nodes.
+            Must be picklable (i.e. defined at module level) when n_jobs != 1.
+        :param outputs: list of str, names of the tables drawn by func
+        :param inputs: list of str, names of the upstream nodes
+        :param params: dict, parameters of func (JSON-serializable, see cache_key)
+        :param files: list of str, paths of files read by func (e.g. a config file)
+        """
+        if name in self.nodes:
+            raise AttributeError(f"node {name} already exists")
+        if len(self.nodes) == self.max_nodes:
+            raise AttributeError(f"no more than {self.max_nodes} nodes")
+        unknown = [node for node in inputs if node not in self.nodes]
+        if unknown:
+            raise AttributeError(f"{name}: unknown upstream nodes {unknown}")
+        node = {
+            "index": len(self.nodes),
+            "func": func,
+            "outputs": list(outputs),
+            "inputs": list(inputs),
+            "params": params or {},
+        }
+        node["fingerprint"] = cache_key(
+            {
+                "name": name,
+                "index": node["index"],
+                "func": _dependencies(func),
+                "params": node["params"],
+                "strata": self.strata,
+                "seed": self.seed,
+                "inputs": [self.nodes[n]["fingerprint"] for n in node["inputs"]],
+            },
+            files=files,
+        )
+        self.nodes[name] = node
+        for table in node["outputs"]:
+            self.producers[table] = name
+
+    def fingerprint(self, name):
+        """
+        :param name: str, name of a node
+        :return: str, fingerprint of the node
+        """
+        return self.nodes[name]["fingerprint"]
+
+    def _draw(self, name, tables):
+        # Tables of each stratum of a node, from the tables of its upstream nodes
+        node = self.nodes[name]
+        upstream = [self._tables(n, tables) for n in node["inputs"]]
+        self.drawn.append(name)
+        return run_strata(
+            _run_node,
+            [
+                (
+                    node["func"],
+                    stratum,
+                    {k: v for inputs in upstream for k, v in inputs[i].items()},
+                    node["params"],
+                )
+                for i, stratum in enumerate(self.strata)
+            ],
+            self.id_generators[node["index"]],
+            seed=int(
+                np.random.SeedSequence(
+                    [self.seed] + list(name.encode())
+                ).generate_state(1)[0]
+            ),
+            n_jobs=self.n_jobs,
+            concat=False,
+        )
+
+    def _tables(self, name, tables):
+        # Tables of each stratum of a node (read from the store, or drawn)
+        if name not in tables:
+            if self.store is None:
+                tables[name] = self._draw(name, tables)
+            else:
+                # tables of the strata are stored as '{stratum}.{table}'
+                entry, _ = self.store.entry(
+                    self.fingerprint(name),
+                    lambda: {
+                        f"{i}.{table}": df
+                        for i, stratum_tables in enumerate(self._draw(name, tables))
+                        for table, df in stratum_tables.items()
+                    },
+                )
+                stored = self.store.load(entry)
+                tables[name] = [
+                    {
+                        table: stored[f"{i}.{table}"]
+                        for table in self.nodes[name]["outputs"]
+                        if f"{i}.{table}" in stored
+                    }
+                    for i in range(len(self.strata))
+                ]
+        return tables[name]
+
+    def run(self, tables=None):
+        """
+        Return tables, drawing only the nodes they depend on that are not in the store.
+
+        The names of the nodes drawn by the run are appended to the drawn attribute.
+
+        :param tables: list of str, names of the tables (all if None)
+        :return: dict, concatenation of the tables of each stratum (name -> pandas.df)
+        """
+        names = list(self.producers) if tables is None else tables
+        unknown = [table for table in names if table not in self.producers]
+        if unknown:
+            raise AttributeError(f"no node draws tables {unknown}")
+        node_tables = {}
+        return {table: self._concat(table, node_tables) for table in names}
+
+    def _concat(self, table, node_tables):
+        # Concatenation of the tables of each stratum
+        frames = [
+            stratum_tables[table]
+            for stratum_tables in self._tables(self.producers[table], node_tables)
+            if table in stratum_tables
+        ]
+        return pd.concat(frames, axis=0) if frames else pd.DataFrame([])
+
+
+class LazyDataset(Mapping):
+    """
+    Tables of a TableDAG, drawn on first access.
+
+    Accessing a table only draws the nodes it depends on (e.g. dataset['note'] does not draw the nodes of
+    other tables), once: tables and the tables of their upstream nodes are kept in memory.
+
+    Parameters
+    ----------
+    dag: TableDAG,
+        nodes drawing the tables.
+    """
+
+    def __init__(self, dag):
+        self.dag = dag
+        self.node_tables = {}
+        self.tables = {}
+
+    def __getitem__(self, name):
+        if name not in self.dag.producers:
+            raise KeyError(name)
+        if name not in self.tables:
+            self.tables[name] = self.dag._concat(name, self.node_tables)
+        return self.tables[name]
+
+    def __iter__(self):
+        return iter(self.dag.producers)
+
+    def __len__(self):
+        return len(self.dag.producers)
+
+    def export(self, path, format="pickle", tables=None, compact=False):
+        """
+        Write tables (drawing the ones that were not accessed yet).
+
+        :param path: str, output directory
+        :param format: str, output format (see write_tables)
+        :param tables: list of str, names of the tables (all if None)
+        :param compact: bool, if True, tables are written with a compact schema (see compact_table)
+        """
+        write_tables(
+            {name: self[name] for name in (self if tables is None else tables)},
+            path,
+            format=format,
+            compact=compact,
+        )
@@ -1,9 +1,8 @@
 import pandas as pd
-import numpy as np
 from .utils import *
 
 
-def transcoding(df_med, df_visit, df_person, transco, nan_in_det_ratio):
+def transcoding(df_med, df_visit, df_person, transco, nan_in_det_ratio, rng=None):
     """
     Replace visit_occurrence_id in df_med by other ids simulating a difference of identifications for visits in
     the medication EHR and the administrative EHR.
@@ -17,6 +16,8 @@ def transcoding(df_med, df_visit, df_person, transco, nan_in_det_ratio):
         type of transcoding (hard or probabilistic)
     nan_in_det_ratio: float,
         ratio of nan in df_transco
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
@@ -31,6 +32,7 @@ def transcoding(df_med, df_visit, df_person, transco, nan_in_det_ratio):
         (schema: ['EHR1_visit_id', 'EHRmed_visit_id', 'prob'])
         None if transco=="hard".
     """
+    rng = check_rng(rng)
     df_transco_visit_hard, df_transco_visit_proba = None, None
     if transco is not None:
         # create df_transco_visit_hard
@@ -43,8 +45,8 @@ def transcoding(df_med, df_visit, df_person, transco, nan_in_det_ratio):
             )
             if nan_in_det_ratio != 0:
                 df_transco_visit_hard = df_transco_visit_hard.assign(
-                    EHRmed_visit_id=lambda pp: pp["EHRmed_visit_id"].apply(
-                        lambda x: np.nan if np.random.random() < nan_in_det_ratio else x
+                    EHRmed_visit_id=lambda pp: pp["EHRmed_visit_id"].mask(
+                        rng.random(len(pp)) < nan_in_det_ratio
                     )
                 )
 
@@ -60,12 +62,9 @@ def transcoding(df_med, df_visit, df_person, transco, nan_in_det_ratio):
             # init
             # "prob" is not uniform (40% of linkage prob are drawn in [0.9, 1], 60% in [0, 0.9])
             df_transco_visit_proba = df_transco_visit_proba.assign(
-                prob=lambda pp: [
-                    np.random.uniform(0.9, 1.0)
-                    if np.random.random() <= 0.4
-                    else np.random.uniform(0.0, 0.9)
-                    for _ in range(len(df_transco_visit_proba))
-                ]
+                prob=lambda pp: draw_uniform_mixture(
+                    len(pp), [(0.4, (0.9, 1.0)), (0.6, (0.0, 0.9))], rng=rng
+                )
             )
 
             # replace ids by the ones of visit resulting to death
@@ -79,14 +78,12 @@ def transcoding(df_med, df_visit, df_person, transco, nan_in_det_ratio):
             list_available_id = df_visit.visit_occurrence_id.unique()
 
             # flaw linkage depends on 'prob'
-            df_transco_visit_proba["EHR1_visit_id"] = df_transco_visit_proba.apply(
-                lambda row: np.random.choice(
-                    [row["EHR1_visit_id"], np.random.choice(list_available_id, 1)[0]],
-                    1,
-                    p=[row["prob"], 1 - row["prob"]],
-                )[0],
-                axis=1,
+            flawed = rng.random(len(df_transco_visit_proba)) < (
+                1 - df_transco_visit_proba["prob"].values
             )
+            ehr1_visit_id = df_transco_visit_proba["EHR1_visit_id"].to_numpy(copy=True)
+            ehr1_visit_id[flawed] = rng.choice(list_available_id, flawed.sum())
+            df_transco_visit_proba["EHR1_visit_id"] = ehr1_visit_id
         df_med = df_med.drop(columns=["visit_occurrence_id"]).rename(
             columns={"transco": "EHRmed_visit_id"}
         )
@@ -106,6 +103,7 @@ def gen_med_table(
     deployment_date_per_hospital=None,
     timeliness_date_per_hospital=None,
     proportion=1.0,
+    rng=None,
 ):
     """
     :param df_visit:
@@ -122,6 +120,8 @@ def gen_med_table(
         date until which data if not made available.
     :param proportion: float,
         ratio of nan "drug_source_value" (between 0 and 1)
+    :param rng: np.random.Generator,
+        random generator (see check_rng).
 
     :return:
     df_med: pandas.df,
@@ -135,6 +135,7 @@ def gen_med_table(
         (schema: ['EHR1_visit_id', 'EHRmed_visit_id', 'prob'])
         None if transco=="hard".
     """
+    rng = check_rng(rng)
 
     if drug_source_value == "control":
         df_med = pd.DataFrame(
@@ -151,30 +152,23 @@ def gen_med_table(
             ["visit_occurrence_id", "visit_start_datetime"]
         ].rename(columns={"visit_start_datetime": "drug_exposure_start_date"})
         df_med = df_med.assign(
-            drug_exposure_id=lambda pp: [
-                id_generator.run("drug_exposure_id") for _ in range(len(df_med))
-            ],
+            drug_exposure_id=lambda pp: id_generator.run_many(
+                "drug_exposure_id", len(pp)
+            ),
             cdm_source=lambda pp: "EHR med",
-            drug_source_value=lambda pp: [
+            drug_source_value=lambda pp: (
                 drug_source_value
                 if proportion == 1
-                else np.random.choice(
-                    [drug_source_value, np.nan], 1, p=[proportion, 1 - proportion]
-                )[0]
-                for _ in range(len(df_med))
-            ],
-            transco=lambda pp: [
-                id_generator.run("drug_transco") for _ in range(len(df_med))
-            ],
-        ).assign(
-            drug_source_value=lambda pp: pp["drug_source_value"].replace(
-                {"nan": np.nan}
-            )
+                else pd.Series(drug_source_value, index=pp.index).mask(
+                    rng.random(len(pp)) >= proportion
+                )
+            ),
+            transco=lambda pp: id_generator.run_many("drug_transco", len(pp)),
         )
 
     if deployment_date_per_hospital:
         df_med = apply_deployment_per_hosp(
-            df_med, df_visit, deployment_date_per_hospital
+            df_med, df_visit, deployment_date_per_hospital, rng=rng
         )
 
     if timeliness_date_per_hospital:
@@ -189,12 +183,12 @@ def gen_med_table(
         ).drop(columns=["care_site_id"])
 
     df_med, df_transco_visit_hard, df_transco_visit_proba = transcoding(
-        df_med, df_visit, df_person, transco, nan_in_det_ratio
+        df_med, df_visit, df_person, transco, nan_in_det_ratio, rng=rng
     )
 
     df_med = df_med.drop(columns=["drug_exposure_start_date"])
 
     # Shuffle dataframe to reset order
-    df_med = df_med.sample(frac=1).reset_index(drop=True)
+    df_med = df_med.sample(frac=1, random_state=rng).reset_index(drop=True)
 
     return df_med, df_transco_visit_hard, df_transco_visit_proba
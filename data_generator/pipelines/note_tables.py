@@ -1,3 +1,4 @@
+import functools
 from .med_tables import gen_med_table
 import pandas as pd
 import numpy as np
@@ -13,6 +14,7 @@ def gen_nlp_extracted_table(
     deployment_date_per_hospital=None,
     timeliness_date_per_hospital=None,
     proportion=1.0,
+    rng=None,
 ):
     """
     Make 'note_nlp' table (based on 'drug_exposure' table but with a renamed schema).
@@ -29,6 +31,8 @@ def gen_nlp_extracted_table(
         date until which data if not made available.
     :param proportion: float,
         ratio of nan "drug_source_value" (between 0 and 1)
+    :param rng: np.random.Generator,
+        random generator (see check_rng).
 
     :return:
     df_nlp: pandas.df,
@@ -42,6 +46,7 @@ def gen_nlp_extracted_table(
         (schema: ['EHR1_visit_id', 'EHRmed_visit_id', 'prob'])
         None if transco=="hard".
     """
+    rng = check_rng(rng)
     df_nlp, df_nlp_tranco_hard, df_nlp_tranco_proba = gen_med_table(
         df_visit,
         df_person,
@@ -51,6 +56,7 @@ def gen_nlp_extracted_table(
         deployment_date_per_hospital=deployment_date_per_hospital,
         timeliness_date_per_hospital=timeliness_date_per_hospital,
         proportion=proportion,
+        rng=rng,
     )
     df_nlp = df_nlp.rename(
         columns={
@@ -97,29 +103,41 @@ contextual_sentences = [
 ]
 
 
-def note_contextual_bis():
+def note_contextual_bis(rng=None):
     """
     Make a note with contextual sentences.
 
+    Parameters
+    ----------
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
     Returns
     -------
     file_content: str
     """
-    return np.random.choice(contextual_sentences, 1)[0]
+    rng = check_rng(rng)
+    return rng.choice(contextual_sentences, 1)[0]
 
 
-def note_contextual():
+def note_contextual(rng=None):
     """
     Make a note content full of 'lorem ipsum'.
 
+    Parameters
+    ----------
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
     Returns
     -------
     file_content: str
     """
-    return " ".join(["lorem ipsum\n"] * np.random.randint(1, 20))
+    rng = check_rng(rng)
+    return " ".join(["lorem ipsum\n"] * rng.integers(1, 20))
 
 
-def gen_relevant_text(word_list, sentences):
+def gen_relevant_text(word_list, sentences, rng=None):
     """
     Make a note content with a sentence in sentences (filled with words in word_list if there are missing words)
     surrounded 'lorem ipsum'.
@@ -130,18 +148,21 @@ def gen_relevant_text(word_list, sentences):
         list of words to replace in the sentence if a word placeholder is detected.
     sentences: list[str],
         list of available sentences.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     sentence: str
     """
-    sentence = np.random.choice(sentences, 1)[0]
+    rng = check_rng(rng)
+    sentence = rng.choice(sentences, 1)[0]
     if "{}" in sentence:
-        sentence = sentence.format(*np.random.choice(word_list, sentence.count("{}")))
+        sentence = sentence.format(*rng.choice(word_list, sentence.count("{}")))
     return sentence
 
 
-def gen_text(word_list, proportion, sentences):
+def gen_text(word_list, proportion, sentences, rng=None):
     """
     Make a note content with a sentence in sentences (filled with words in word_list if there are missing words)
     surrounded 'lorem ipsum'.
@@ -154,23 +175,113 @@ def gen_text(word_list, proportion, sentences):
         ratio of nan "drug_source_value" (between 0 and 1)
     sentences: list[str],
         list of available sentences.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     sentence: str
 
     """
+    rng = check_rng(rng)
     text = (
-        note_contextual_bis()
+        note_contextual_bis(rng)
         + "\n"
-        + gen_relevant_text(word_list, sentences)
+        + gen_relevant_text(word_list, sentences, rng)
         + "\n"
-        + note_contextual_bis()
+        + note_contextual_bis(rng)
     )
     if proportion == 1:
         return text
     else:
-        return np.random.choice([text, np.nan], 1, p=[proportion, 1 - proportion])[0]
+        return rng.choice([text, np.nan], 1, p=[proportion, 1 - proportion])[0]
+
+
+@functools.lru_cache(maxsize=None)
+def compile_sentences(sentences):
+    """
+    Compile sentences into templates: each sentence is split on its '{}' word placeholders.
+
+    Parameters
+    ----------
+    sentences: tuple[str],
+        available sentences.
+
+    Returns
+    -------
+    templates: tuple of tuple[str],
+        for each sentence, the text around its placeholders.
+    """
+    return tuple(tuple(sentence.split("{}")) for sentence in sentences)
+
+
+def gen_relevant_texts(n, word_list, sentences, rng=None):
+    """
+    Make n sentences at once (batch version of gen_relevant_text).
+
+    Parameters
+    ----------
+    n: int,
+        number of sentences.
+    word_list: list[str],
+        list of words to replace in the sentence if a word placeholder is detected.
+    sentences: list[str],
+        list of available sentences.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    sentence: np array of object
+    """
+    rng = check_rng(rng)
+    words = np.asarray(word_list, dtype=object)
+    i_sentence = rng.integers(len(sentences), size=n)
+    text = np.empty(n, dtype=object)
+    for i, template in enumerate(compile_sentences(tuple(sentences))):
+        rows = np.flatnonzero(i_sentence == i)
+        text_rows = np.full(len(rows), template[0], dtype=object)
+        for part in template[1:]:
+            text_rows = (
+                text_rows + words[rng.integers(len(words), size=len(rows))] + part
+            )
+        text[rows] = text_rows
+    return text
+
+
+def gen_texts(n, word_list, proportion, sentences, rng=None):
+    """
+    Make n note contents at once (batch version of gen_text).
+
+    Parameters
+    ----------
+    n: int,
+        number of notes.
+    word_list: list[str],
+        list of words to replace in the sentence if a word placeholder is detected.
+    proportion: float,
+        ratio of nan "drug_source_value" (between 0 and 1)
+    sentences: list[str],
+        list of available sentences.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
+
+    Returns
+    -------
+    text: np array of object (np.nan for missing notes)
+    """
+    rng = check_rng(rng)
+    contextual = np.asarray(contextual_sentences, dtype=object)
+    text = (
+        contextual[rng.integers(len(contextual), size=n)]
+        + "\n"
+        + gen_relevant_texts(n, word_list, sentences, rng)
+        + "\n"
+        + contextual[rng.integers(len(contextual), size=n)]
+    )
+    if proportion != 1:
+        text[rng.random(n) >= proportion] = np.nan
+    return text
 
 
 def duplicate_note(
@@ -180,6 +291,7 @@ def duplicate_note(
     sentences,
     proportion,
     id_generator,
+    rng=None,
 ):
     """
     Generate duplicated notes for visits.
@@ -187,35 +299,52 @@ def duplicate_note(
     Parameters
     ----------
     df_note
-    duplicate_note_per_visit_ratio: flaot,
-        ratio of visits with duplicated notes.
+    duplicate_note_per_visit_ratio: dict,
+        ratio of visits with duplicated notes, for each number of notes per visit (e.g. {2: 0.3, 3: 0.1}).
+        Visits get a single multiplicity: ratios must sum to at most 1.
     word_list: list[str],
         list of words to replace in the sentence if a word placeholder is detected.
     proportion: float,
         ratio of nan "drug_source_value" (between 0 and 1)
     sentences: list[str],
         list of available sentences.
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
     df_note with duplicated notes.
     """
+    rng = check_rng(rng)
 
     if duplicate_note_per_visit_ratio is not None:
-        for n_dup, ratio in duplicate_note_per_visit_ratio.items():
-            for _ in range(n_dup - 1):
-                df_note_dup = df_note.sample(int(ratio * len(df_note)))
-                df_note_dup = df_note_dup.assign(
-                    note_id=lambda pp: [
-                        id_generator.run("note_id") for _ in range(len(df_note_dup))
-                    ]
-                ).assign(
-                    note_text=lambda pp: [
-                        gen_text(word_list, proportion, sentences)
-                        for _ in range(len(df_note_dup))
-                    ]
-                )
-                df_note = pd.concat([df_note, df_note_dup], axis=0)
+        # disjoint sets of notes for the multiplicities: notes of a set are repeated n_dup - 1 times
+        # (their visit then has exactly n_dup notes)
+        n_notes = [
+            int(ratio * len(df_note))
+            for ratio in duplicate_note_per_visit_ratio.values()
+        ]
+        if sum(n_notes) > len(df_note):
+            raise AttributeError(
+                f"duplicate_note_per_visit_ratio {duplicate_note_per_visit_ratio} ratios must sum to at most 1"
+            )
+        i_sets = np.split(
+            rng.permutation(len(df_note))[: sum(n_notes)], np.cumsum(n_notes)[:-1]
+        )
+        i_dup = np.concatenate(
+            [np.array([], dtype=int)]
+            + [
+                np.repeat(i_set, n_dup - 1)
+                for n_dup, i_set in zip(duplicate_note_per_visit_ratio, i_sets)
+            ]
+        )
+        df_note_dup = df_note.iloc[i_dup].assign(
+            note_id=lambda pp: id_generator.run_many("note_id", len(pp)),
+            note_text=lambda pp: gen_texts(
+                len(pp), word_list, proportion, sentences, rng
+            ),
+        )
+        df_note = pd.concat([df_note, df_note_dup], axis=0)
     return df_note
 
 
@@ -248,6 +377,7 @@ def gen_note_table(
     proportion=1.0,
     duplicate_note_per_visit_ratio=None,
     deployment_date_per_hospital=None,
+    rng=None,
 ):
     """
 
@@ -258,30 +388,30 @@ def gen_note_table(
         ratio of nan "drug_source_value" (between 0 and 1)
     sentences: list[str],
         list of available sentences.
+    rng: np.random.Generator,
+        random generator (see check_rng).
 
     :return:
     df_note: pandas.df,
         "note" table
     """
+    rng = check_rng(rng)
 
     df_note = (
         df_visit.drop_duplicates()[["visit_occurrence_id", "visit_start_datetime"]]
         .rename(columns={"visit_start_datetime": "note_datetime"})
         .assign(
-            note_id=lambda pp: [
-                id_generator.run("note_id") for _ in range(len(df_visit))
-            ],
+            note_id=lambda pp: id_generator.run_many("note_id", len(pp)),
             cdm_source=lambda pp: "EHR 1",
-            note_text=lambda pp: [
-                gen_text(word_list, proportion, sentences) for _ in range(len(df_visit))
-            ],
+            note_text=lambda pp: gen_texts(
+                len(pp), word_list, proportion, sentences, rng
+            ),
         )
-        .assign(note_text=lambda pp: pp["note_text"].replace({"nan": np.nan}))
     )
 
     if deployment_date_per_hospital:
         df_note = apply_deployment_per_hosp(
-            df_note, df_visit, deployment_date_per_hospital
+            df_note, df_visit, deployment_date_per_hospital, rng=rng
         )
 
     df_note = duplicate_note(
@@ -291,11 +421,12 @@ def gen_note_table(
         sentences,
         proportion,
         id_generator,
+        rng=rng,
     )
 
     df_note["note_datetime"] = pd.to_datetime(df_note["note_datetime"])
 
     # Shuffle dataframe to reset order
-    df_note = df_note.sample(frac=1).reset_index(drop=True)
+    df_note = df_note.sample(frac=1, random_state=rng).reset_index(drop=True)
 
     return df_note
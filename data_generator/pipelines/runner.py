@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+def _run_stratum(gen_stratum, stratum, seed_seq, id_generator):
+    # Run one stratum with np.random seeded by its own child seed (the caller state is left untouched)
+    state = np.random.get_state()
+    np.random.seed(seed_seq.generate_state(4))
+    try:
+        return gen_stratum(stratum, id_generator)
+    finally:
+        np.random.set_state(state)
+
+
+def env_n_jobs(default=1):
+    """
+    Number of processes of the exercise scripts, set by $EDS_TUTORIAL_JOBS (0 for all cpus).
+
+    :param default: int, number of processes if $EDS_TUTORIAL_JOBS is not set
+    :return: int, or None for all cpus (see run_strata)
+    """
+    n_jobs = int(os.environ.get("EDS_TUTORIAL_JOBS", default))
+    return None if n_jobs == 0 else n_jobs
+
+
+def run_strata(gen_stratum, strata, id_generator, seed=None, n_jobs=1, concat=True):
+    """
+    Generate the tables of each stratum in a process pool and concatenate them.
+
+    Each stratum gets a child seed (np.random.SeedSequence.spawn) and a child id generator
+    (idGenerator.spawn), so that the output does not depend on n_jobs.
+
+    Parameters
+    ----------
+    gen_stratum: function,
+        gen_stratum(stratum, id_generator) returns a dict of tables (name -> pandas.df).
+        Must be picklable (i.e. defined at module level) when n_jobs != 1.
+    strata: list,
+        parameters of each stratum (e.g. (age_range, gender, case)), passed to gen_stratum.
+    id_generator: idGenerator,
+        generator split between strata. It should not be used afterwards.
+    seed: int (default None),
+        seed of the strata. If None, drawn from np.random.
+    n_jobs: int (default 1),
+        number of processes (all cpus if None). 1 runs the strata in the current process.
+    concat: bool (default True),
+        if False, the tables of each stratum are returned without being concatenated.
+
+    Returns
+    -------
+    tables: dict,
+        concatenation of the tables of each stratum, in the order of strata
+        (list of the dicts of each stratum if concat is False).
+    """
+    strata = list(strata)
+    if not strata:
+        return {} if concat else []
+    args = _spawn_strata(gen_stratum, strata, id_generator, seed)
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    if n_jobs == 1:
+        results = list(map(_run_stratum, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(strata))) as executor:
+            # map returns results in the order of strata, whatever the order of completion
+            results = list(executor.map(_run_stratum, *args))
+
+    if not concat:
+        return results
+    return {
+        name: pd.concat([result[name] for result in results], axis=0)
+        for name in results[0]
+    }
+
+
+def stream_strata(gen_stratum, strata, id_generator, seed=None):
+    """
+    Generate the tables of each stratum in the current process, one stratum at a time.
+
+    Strata get the same seeds and id generators as with run_strata, so that the concatenation of the
+    yielded tables is the output of run_strata. Only one stratum is in memory at a time.
+
+    Parameters
+    ----------
+    gen_stratum: function,
+        gen_stratum(stratum, id_generator) returns a dict of tables (name -> pandas.df).
+    strata: list,
+        parameters of each stratum, passed to gen_stratum.
+    id_generator: idGenerator,
+        generator split between strata. It should not be used afterwards.
+    seed: int (default None),
+        seed of the strata. If None, drawn from np.random.
+
+    Returns
+    -------
+    tables: iterator of dict,
+        tables of each stratum, in the order of strata (seeds are drawn at the call, strata are
+        generated during the iteration).
+    """
+    strata = list(strata)
+    if not strata:
+        return iter(())
+    return map(_run_stratum, *_spawn_strata(gen_stratum, strata, id_generator, seed))
+
+
+def _spawn_strata(gen_stratum, strata, id_generator, seed):
+    # Arguments of _run_stratum for each stratum: child seeds and child id generators
+    if seed is None:
+        seed = int(np.random.randint(0, 2 ** 32))
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(strata))
+    id_generators = id_generator.spawn(len(strata))
+    return [gen_stratum] * len(strata), strata, seed_seqs, id_generators
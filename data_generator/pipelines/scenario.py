@@ -0,0 +1,393 @@
+import copy
+import datetime
+import inspect
+import itertools
+import sys
+
+import numpy as np
+import pandas as pd
+import yaml
+from dateutil.relativedelta import relativedelta
+
+from .admin_tables import deduplicate_patient, duplicate_patient_visit, gen_admin_tables
+from .bio_tables import gen_bio_table
+from .condition_tables import gen_comorb_table, gen_condition_table
+from .med_tables import gen_med_table
+from .note_tables import gen_nlp_extracted_table, gen_note_table
+from .cache import DatasetCache, cache_key
+from .runner import env_n_jobs, run_strata
+from .utils import idGenerator, load_conf
+from .writer import write_tables
+
+
+# Pipeline functions available to the stages of a scenario
+STAGE_FUNCS = {
+    "gen_admin_tables": gen_admin_tables,
+    "duplicate_patient_visit": duplicate_patient_visit,
+    "deduplicate_patient": deduplicate_patient,
+    "gen_condition_table": gen_condition_table,
+    "gen_comorb_table": gen_comorb_table,
+    "gen_med_table": gen_med_table,
+    "gen_nlp_extracted_table": gen_nlp_extracted_table,
+    "gen_note_table": gen_note_table,
+    "gen_bio_table": gen_bio_table,
+}
+# Stages drawing new patients or visits are run stratum by stratum, the other ones are batched
+PER_STRATUM_FUNCS = ["gen_admin_tables", "duplicate_patient_visit"]
+# Columns assigning the rows of a batched stage to their stratum (in order of preference)
+STRATUM_KEYS = ["visit_occurrence_id", "person_id"]
+DATE_OFFSETS = ["days", "weeks", "months", "years"]
+
+
+def load_scenario(path):
+    """
+    Read a scenario file (YAML).
+
+    :param path: str, path of the scenario
+    :return: dict, scenario spec (see compile_scenario)
+    """
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def _match(params, when):
+    # True if the stratum params match all the values of a 'when' clause ({'in': [...]} for several values)
+    for name, value in when.items():
+        if name not in params:
+            raise AttributeError(f"unknown parameter {name} in when clause {when}")
+        if isinstance(value, dict):
+            if params[name] not in value["in"]:
+                return False
+        elif params[name] != value:
+            return False
+    return True
+
+
+def _stratum_params(spec, values):
+    # conf values, scenario params and strata values, patched by the override rules in order
+    params = {**load_conf(), **spec.get("params", {}), **values}
+    for rule in spec.get("overrides", []):
+        if _match(params, rule.get("when", {})):
+            params.update(rule["set"])
+    return params
+
+
+def _resolve(value, params):
+    # Replace '$name' strings by the value of the stratum parameter name
+    if isinstance(value, str) and value.startswith("$"):
+        if value[1:] not in params:
+            raise AttributeError(f"unknown parameter {value}")
+        return copy.deepcopy(params[value[1:]])
+    if isinstance(value, list):
+        return [_resolve(v, params) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v, params) for k, v in value.items()}
+    return value
+
+
+def _resolve_date(value, t_end):
+    # {'days': -45} (or weeks, months, years) is a date relative to t_end, other values are kept
+    if isinstance(value, dict) and value and set(value) <= set(DATE_OFFSETS):
+        return t_end + relativedelta(**value)
+    if isinstance(value, list):
+        return tuple(_resolve_date(v, t_end) for v in value)
+    return value
+
+
+def _hospital_effects(effects, params):
+    # Arguments of a stage given per hospital ('all' stands for every hospital of list_hospital)
+    t_end = params["t_end"]
+    if isinstance(t_end, str):
+        t_end = datetime.date.fromisoformat(t_end)
+    args = {}
+    for arg, per_hospital in _resolve(effects, params).items():
+        values = {}
+        for hospital, value in per_hospital.items():
+            for h in params["list_hospital"] if hospital == "all" else [hospital]:
+                values[h] = _resolve_date(value, t_end)
+        # hospital_anomaly is a list of (hospital, (start date, end date))
+        args[arg] = list(values.items()) if arg == "hospital_anomaly" else values
+    return args
+
+
+def compile_scenario(spec):
+    """
+    Compile a scenario into an execution plan.
+
+    A scenario describes:
+        - seed: int, seed of the generation (drawn from np.random if missing).
+        - strata: dict, values of each factor (e.g. {'age_range': [[0, 5], [5, 18]], 'case': ['drugA']}),
+          the strata are their cartesian product.
+        - params: dict, parameters shared by the strata (conf.yaml values are available as well).
+        - overrides: list of rules {'when': {factor or param: value}, 'set': {param: value}}, applied in
+          order to the params of the matching strata ({'in': [...]} matches several values).
+        - stages: list of pipeline calls {'name', 'func', 'inputs', 'outputs', 'args', 'hospital_effects',
+          'when'}: func is a key of STAGE_FUNCS, inputs maps arguments to tables (or lists of tables,
+          concatenated), outputs names the returned tables (null to drop one), '$param' strings in args
+          are replaced by the params of the stratum, hospital_effects gives arguments per hospital
+          (e.g. {'timeliness_date_per_hospital': {'all': {'days': -45}}}, dates as {'days', 'weeks',
+          'months', 'years'} are relative to t_end) and the stage only runs on strata matching when.
+        - output: dict, 'path', 'format' and 'compact' (see write_tables), 'tables' mapping output
+          names to tables (or lists of tables, concatenated) and 'shuffle', tables whose rows are
+          shuffled.
+
+    Stages drawing new patients (PER_STRATUM_FUNCS) are called once per stratum. The calls of the other
+    stages are batched: strata with the same resolved arguments share one call on their concatenated
+    inputs.
+
+    Parameters
+    ----------
+    spec: dict,
+        scenario (see load_scenario).
+
+    Returns
+    -------
+    plan: dict,
+        'seed', 'strata' (values of each stratum), 'steps' (for each stage, its calls as
+        (args, indices of the strata)) and 'output'.
+    """
+    factors = spec.get("strata", {})
+    strata = [
+        dict(zip(factors, values)) for values in itertools.product(*factors.values())
+    ]
+    params = [_stratum_params(spec, values) for values in strata]
+
+    steps = []
+    for i_stage, stage in enumerate(spec["stages"]):
+        name = stage.get("name", f"stage {i_stage}")
+        if stage["func"] not in STAGE_FUNCS:
+            raise AttributeError(
+                f"{name}: func {stage['func']} must be in {list(STAGE_FUNCS)}"
+            )
+        calls = {}
+        for i, stratum_params in enumerate(params):
+            if not _match(stratum_params, stage.get("when", {})):
+                continue
+            args = _resolve(stage.get("args", {}), stratum_params)
+            args.update(
+                _hospital_effects(stage.get("hospital_effects", {}), stratum_params)
+            )
+            key = i if stage["func"] in PER_STRATUM_FUNCS else repr(args)
+            calls.setdefault(key, (args, []))[1].append(i)
+        steps.append(
+            {
+                "name": name,
+                "func": stage["func"],
+                "inputs": stage.get("inputs", {}),
+                "outputs": stage["outputs"],
+                "calls": list(calls.values()),
+            }
+        )
+
+    return {
+        "seed": spec.get("seed"),
+        "strata": strata,
+        "steps": steps,
+        "output": spec.get("output", {}),
+    }
+
+
+def _input_tables(step, tables, members):
+    # Concatenation of the input tables of the given strata
+    inputs = {}
+    for arg, names in step["inputs"].items():
+        names = [names] if isinstance(names, str) else names
+        frames = []
+        for i in members:
+            for name in names:
+                if name not in tables[i]:
+                    raise AttributeError(
+                        f"{step['name']}: no table {name} in stratum {i}"
+                    )
+                frames.append(tables[i][name])
+        inputs[arg] = pd.concat(frames, axis=0)
+    return inputs
+
+
+def _call_stage(step, args, inputs, id_generator, rng=None):
+    # Call the pipeline function of a step and name its tables
+    func = STAGE_FUNCS[step["func"]]
+    kwargs = {**args, **inputs, "rng": rng}
+    if "id_generator" in inspect.signature(func).parameters:
+        kwargs["id_generator"] = id_generator
+    result = func(**kwargs)
+    result = result if isinstance(result, tuple) else (result,)
+    if len(result) != len(step["outputs"]):
+        raise AttributeError(
+            f"{step['name']}: {step['func']} returns {len(result)} tables, "
+            f"outputs names {len(step['outputs'])}"
+        )
+    return {name: df for name, df in zip(step["outputs"], result) if name is not None}
+
+
+def _run_steps(calls, id_generator):
+    # Run the per-stratum steps of one stratum (np.random is seeded by run_strata)
+    tables = {}
+    for step, args in calls:
+        tables.update(
+            _call_stage(step, args, _input_tables(step, [tables], [0]), id_generator)
+        )
+    return tables
+
+
+def _stratum_index(tables, key):
+    # Stratum of each value of key (pandas.Series indexed by the values)
+    index = pd.concat(
+        [
+            pd.Series(i, index=df[key].dropna().unique())
+            for i, stratum_tables in enumerate(tables)
+            for df in stratum_tables.values()
+            if key in df
+        ]
+        + [pd.Series([], dtype=int)]
+    )
+    return index[~index.index.duplicated()]
+
+
+def _split(name, df, members, tables):
+    # Rows of a batched table for each of its strata
+    if len(members) == 1:
+        return [df]
+    for key in STRATUM_KEYS:
+        if key in df:
+            stratum = df[key].map(_stratum_index(tables, key)).to_numpy()
+            if pd.isna(stratum).any():
+                raise AttributeError(f"rows of {name} cannot be assigned to a stratum")
+            return [df[stratum == i] for i in members]
+    # tables without keys are kept whole in the first stratum of the call
+    return [df] + [df.iloc[:0]] * (len(members) - 1)
+
+
+def run_plan(plan, id_generator=None, n_jobs=1):
+    """
+    Generate the tables of an execution plan (see compile_scenario).
+
+    The leading per-stratum stages (e.g. gen_admin_tables) are run by run_strata in a process pool,
+    then the other stages are run in order in the current process, once per call.
+
+    Parameters
+    ----------
+    plan: dict,
+        execution plan (see compile_scenario).
+    id_generator: idGenerator (default None),
+        used to generate PKs in tables. If None, an idGenerator seeded by the seed of the plan, so that
+        ids are reproducible as well.
+    n_jobs: int (default 1),
+        number of processes (see run_strata).
+
+    Returns
+    -------
+    tables: dict,
+        output tables (name -> pandas.df).
+    """
+    seed = plan["seed"]
+    if seed is None:
+        seed = int(np.random.randint(0, 2 ** 32))
+    if id_generator is None:
+        id_generator = idGenerator(seed=seed)
+    strata_id_generator, batch_id_generator = id_generator.spawn(2)
+    strata_seq, steps_seq, output_seq = np.random.SeedSequence(seed).spawn(3)
+
+    n_strata = len(plan["strata"])
+    steps = plan["steps"]
+    n_first = 0
+    while n_first < len(steps) and steps[n_first]["func"] in PER_STRATUM_FUNCS:
+        n_first += 1
+    tables = run_strata(
+        _run_steps,
+        [
+            [
+                (step, args)
+                for step in steps[:n_first]
+                for args, members in step["calls"]
+                if i in members
+            ]
+            for i in range(n_strata)
+        ],
+        strata_id_generator,
+        seed=int(strata_seq.generate_state(1)[0]),
+        n_jobs=n_jobs,
+        concat=False,
+    )
+
+    for step, step_seq in zip(steps[n_first:], steps_seq.spawn(len(steps))):
+        for (args, members), call_seq in zip(
+            step["calls"], step_seq.spawn(len(step["calls"]))
+        ):
+            outputs = _call_stage(
+                step,
+                args,
+                _input_tables(step, tables, members),
+                batch_id_generator,
+                np.random.default_rng(call_seq),
+            )
+            for name, df in outputs.items():
+                for i, part in zip(members, _split(name, df, members, tables)):
+                    tables[i][name] = part
+
+    return _output_tables(plan["output"], tables, np.random.default_rng(output_seq))
+
+
+def _output_tables(output, tables, rng):
+    # Concatenation of the tables of all strata, named as in output['tables']
+    names = output.get("tables") or {
+        name: name for stratum_tables in tables for name in stratum_tables
+    }
+    outputs = {}
+    for output_name, table_names in names.items():
+        table_names = [table_names] if isinstance(table_names, str) else table_names
+        frames = [
+            stratum_tables[name]
+            for stratum_tables in tables
+            for name in table_names
+            if name in stratum_tables
+        ]
+        df = pd.concat(frames, axis=0) if frames else pd.DataFrame([])
+        if output_name in output.get("shuffle", []):
+            df = df.sample(frac=1, random_state=rng)
+        outputs[output_name] = df
+    return outputs
+
+
+def run_scenario(path, n_jobs=1, format=None, cache=None):
+    """
+    Generate the tables of a scenario file and write them to its output path.
+
+    :param path: str, path of the scenario (see compile_scenario)
+    :param n_jobs: int, number of processes (see run_strata)
+    :param format: str, output format (see write_tables). If None, the one of the scenario (default pickle).
+    :param cache: DatasetCache, if not None, tables of a scenario with a seed are read from the cache when
+        the scenario, the configuration files and the code did not change (see cache_key)
+    :return: dict, output tables (name -> pandas.df)
+    """
+    spec = load_scenario(path)
+    plan = compile_scenario(spec)
+    output = plan["output"]
+    format = format or output.get("format", "pickle")
+    compact = output.get("compact", False)
+
+    if cache is None or plan["seed"] is None:
+        tables = run_plan(plan, n_jobs=n_jobs)
+        if "path" in output:
+            write_tables(tables, output["path"], format=format, compact=compact)
+        return tables
+
+    entry, _ = cache.entry(
+        cache_key(spec),
+        lambda: run_plan(plan, n_jobs=n_jobs),
+        format=format,
+        compact=compact,
+    )
+    if "path" in output:
+        cache.link(entry, output["path"])
+    return cache.load(entry)
+
+
+if __name__ == "__main__":
+    # python -m data_generator.pipelines.scenario path [format], with $EDS_TUTORIAL_JOBS processes
+    run_scenario(
+        sys.argv[1],
+        n_jobs=env_n_jobs(),
+        format=sys.argv[2] if len(sys.argv) > 2 else None,
+        cache=DatasetCache(),
+    )
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Low-cardinality string columns of the generated tables
+CATEGORICAL_COLS = [
+    "care_site_id",
+    "cdm_source",
+    "gender_source_value",
+    "visit_source_value",
+    "condition_source_value",
+    "drug_source_value",
+    "extracted_concept_source_value",
+    "concept_source_value",
+    "transformed_unit",
+]
+
+# datetime64[s] columns require pandas >= 2 (older versions only support nanoseconds)
+DATETIME_DTYPE = (
+    "datetime64[s]" if int(pd.__version__.split(".")[0]) >= 2 else "datetime64[ns]"
+)
+
+
+def _compact_id(values):
+    # int32 ids if they all fit (8-digit ids do), else unchanged
+    info = np.iinfo(np.int32)
+    if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+        return values.astype(np.int32)
+    return values
+
+
+def compact_table(df):
+    """
+    Return a table with a compact schema.
+
+    Low-cardinality string columns (see CATEGORICAL_COLS) become categoricals (dictionary strings in
+    parquet and arrow datasets), integer ids ('*_id' columns) become int32 when they fit and dates
+    become datetime64[s] (datetime64[ns] with pandas < 2). Missing values are kept (ids with missing
+    values are floats and are not converted).
+
+    :param df: pandas.df
+    :return: pandas.df, with the same columns and values
+    """
+    columns = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col in CATEGORICAL_COLS and not isinstance(dtype, pd.CategoricalDtype):
+            columns[col] = df[col].astype("category")
+        elif str(col).endswith("_id") and pd.api.types.is_integer_dtype(dtype):
+            columns[col] = _compact_id(df[col])
+        elif pd.api.types.is_datetime64_any_dtype(dtype) and dtype != DATETIME_DTYPE:
+            columns[col] = df[col].astype(DATETIME_DTYPE)
+    return df.assign(**columns)
+
+
+def compact_tables(tables):
+    """
+    Return tables with a compact schema (see compact_table).
+
+    Categories depend on the values of each table: tables should be compacted after being
+    concatenated (e.g. the output of run_strata), or written as they are (see DatasetWriter).
+
+    :param tables: dict, tables (name -> pandas.df)
+    :return: dict, compact tables (name -> pandas.df)
+    """
+    return {name: compact_table(df) for name, df in tables.items()}
@@ -0,0 +1,96 @@
+import functools
+
+from .admin_tables import gen_admin_tables
+from .runner import stream_strata
+
+
+def chunk_sizes(n_patient, chunk_size):
+    """
+    Split a number of patients into chunks.
+
+    :param n_patient: int, number of patients
+    :param chunk_size: int, maximum number of patients per chunk
+    :return: list of int, number of patients of each chunk
+    """
+    if chunk_size < 1:
+        raise AttributeError(f"chunk_size {chunk_size} must be positive")
+    return [
+        min(chunk_size, n_patient - start) for start in range(0, n_patient, chunk_size)
+    ]
+
+
+def gen_chunk(n_patient, id_generator, gen_derived_tables=None, **admin_kwargs):
+    """
+    Draw the tables of a chunk of patients.
+
+    Parameters
+    ----------
+    n_patient: int,
+        number of patients of the chunk.
+    id_generator: idGenerator,
+        used to generate PKs in tables.
+    gen_derived_tables: function (default None),
+        gen_derived_tables(df_person, df_visit, id_generator) returns a dict of tables drawn from the
+        patients of the chunk (e.g. {"condition": gen_condition_table(df_visit, id_generator, ...)}).
+    admin_kwargs:
+        parameters of gen_admin_tables (batch mode).
+
+    Returns
+    -------
+    tables: dict,
+        'person' and 'visit' tables, and the tables of gen_derived_tables.
+    """
+    df_person, df_visit = gen_admin_tables(
+        None, id_generator, n_patient=n_patient, batch=True, **admin_kwargs
+    )
+    tables = {"person": df_person, "visit": df_visit}
+    if gen_derived_tables is not None:
+        tables.update(gen_derived_tables(df_person, df_visit, id_generator))
+    return tables
+
+
+def stream_tables(
+    n_patient,
+    id_generator,
+    chunk_size=100000,
+    gen_derived_tables=None,
+    seed=None,
+    **admin_kwargs,
+):
+    """
+    Draw the tables of n_patient patients chunk by chunk, so that memory does not depend on n_patient.
+
+    Each chunk is drawn by gen_chunk with its own seed and id generator (see stream_strata): chunks
+    can be written as they are yielded, or drawn in parallel with
+    run_strata(functools.partial(gen_chunk, ...), chunk_sizes(n_patient, chunk_size), ...).
+    Independent workers (e.g. on several machines) can rather draw their own chunks with gen_chunk and
+    the id generators leased by a shared idAllocator.
+
+    Parameters
+    ----------
+    n_patient: int,
+        number of patients.
+    id_generator: idGenerator,
+        generator split between chunks. It should not be used afterwards.
+    chunk_size: int (default 100000),
+        maximum number of patients per chunk.
+    gen_derived_tables: function (default None),
+        see gen_chunk.
+    seed: int (default None),
+        seed of the chunks. If None, drawn from np.random.
+    admin_kwargs:
+        parameters of gen_admin_tables (batch mode).
+
+    Returns
+    -------
+    tables: iterator of dict,
+        tables of each chunk (see gen_chunk).
+    """
+    return stream_strata(
+        functools.partial(
+            gen_chunk, gen_derived_tables=gen_derived_tables, **admin_kwargs
+        ),
+        chunk_sizes(n_patient, chunk_size),
+        id_generator,
+        seed,
+    )
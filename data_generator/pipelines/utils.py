@@ -1,6 +1,35 @@
 import datetime
+import functools
+import os
 import numpy as np
 import pandas as pd
+import yaml
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+
+@functools.lru_cache(maxsize=None)
+def load_conf():
+    """
+    Read conf.yaml (once: later calls return the same dict, which should not be modified).
+
+    :return: dict, configuration of the generators (hospitals, ICD10 codes, dates, ...)
+    """
+    with open(os.path.join(dir_path, "..", "conf.yaml")) as f:
+        return yaml.safe_load(f)
+
+
+def check_rng(rng=None):
+    """
+    Return a numpy random Generator.
+
+    :param rng: np.random.Generator, int (seed) or None. If None, the generator is seeded from the global
+        np.random state, so that np.random.seed still makes draws reproducible.
+    :return: np.random.Generator
+    """
+    if rng is None:
+        rng = np.random.randint(0, 2 ** 32, size=4, dtype=np.uint64)
+    return np.random.default_rng(rng)
 
 
 def apply_timeliness_per_hosp(df_to_process, date_col, timeliness_date_per_hospital):
@@ -20,33 +49,243 @@ def apply_timeliness_per_hosp(df_to_process, date_col, timeliness_date_per_hospi
     df_to_process: pandas.df,
         initial df with delete data
     """
-    list_idx = []
-    for i, row in df_to_process.iterrows():
-        if row[date_col].date() <= timeliness_date_per_hospital[row["care_site_id"]]:
-            list_idx.append(i)
-    df_to_process = df_to_process.iloc[list_idx]
+    unknown_hospitals = set(df_to_process["care_site_id"]) - set(
+        timeliness_date_per_hospital
+    )
+    if unknown_hospitals:
+        raise KeyError(f"no timeliness date for {sorted(unknown_hospitals)}")
+    df_to_process = df_to_process[
+        _to_days(df_to_process[date_col])
+        <= _hospital_dates(df_to_process["care_site_id"], timeliness_date_per_hospital)
+    ]
     return df_to_process
 
 
+def _to_days(dates):
+    # datetime column as an array of datetime64[D] (same as calling .date() on each row)
+    return pd.to_datetime(dates).values.astype("datetime64[D]")
+
+
+def _hospital_dates(care_site_id, date_per_hospital):
+    # date of the hospital of each row as an array of datetime64[D] (NaT if not in date_per_hospital)
+    return _to_days(care_site_id.map(date_per_hospital))
+
+
 class idGenerator:
-    def __init__(self):
+    """
+    Generate unique random ids for each key (e.g. 'person_id').
+
+    Ids of a key are the images of 0, 1, 2... by a keyed pseudo-random permutation of
+    [0, 10 ** (width - 1)) (Feistel network with cycle walking), shifted to start at 8 * 10 ** (width - 1).
+    Nothing is materialized: memory does not depend on the number of ids.
+    The i-th id of a key is drawn from position start + i * step (below stop), so that generators sharing
+    the permutations but not the positions (see spawn and idAllocator) never draw the same id.
+
+    Parameters
+    ----------
+    width: int (default 8),
+        number of digits of the ids (at most 10 ** (width - 1) ids per key).
+    seed: int (default None),
+        seed of the permutations. If None, they are drawn from np.random at the first id of each key.
+    """
+
+    n_rounds = 4
+
+    def __init__(self, width=8, seed=None):
+        if not 2 <= width <= 18:
+            raise AttributeError(f"id width {width} must be between 2 and 18")
+        self.width = width
+        self.seed = seed
+        self.n_ids = 10 ** (width - 1)
+        self.half_bits = (int(self.n_ids - 1).bit_length() + 1) // 2
+        self.start, self.step, self.stop = 0, 1, self.n_ids
         self.taboo = {}
-        self.ids = {}
+        self.round_keys = {}
 
-    def run(self, key):
-        if key not in self.taboo:
-            i = 0
-            self.taboo[key] = 1
-            self.ids[key] = np.arange(80_000_000, 90_000_000)
-            np.random.shuffle(self.ids[key])
+    def _round_keys(self, key):
+        if self.seed is None:
+            round_keys = np.random.randint(0, 2 ** 32, size=self.n_rounds)
         else:
-            i = self.taboo[key]
-            self.taboo[key] += 1
+            round_keys = np.random.SeedSequence(
+                [self.seed] + list(key.encode())
+            ).generate_state(self.n_rounds)
+        return [int(round_key) for round_key in round_keys]
+
+    def _reserve(self, key, n):
+        # Return the index of the first of n new ids for key
+        if key not in self.taboo:
+            self.taboo[key] = 0
+            self.round_keys[key] = self._round_keys(key)
+        i = self.taboo[key]
+        if self.start + (i + n - 1) * self.step >= self.stop:
+            raise IndexError(
+                f"no more than {len(range(self.start, self.stop, self.step))} ids "
+                f"of width {self.width} can be drawn for {key}"
+            )
+        self.taboo[key] += n
+        return i
+
+    def spawn(self, n):
+        """
+        Split the remaining ids into n generators (e.g. one per process).
+
+        Children share the permutations of the generator and draw interleaved positions, so their ids
+        never collide with each other nor with the ids already drawn. The generator itself should not
+        be used afterwards.
+
+        Parameters
+        ----------
+        n: int,
+            number of generators.
+
+        Returns
+        -------
+        children: list of idGenerator
+        """
+        if self.seed is None:
+            # permutations of the keys not drawn yet must be shared too
+            self.seed = int(np.random.randint(0, 2 ** 32))
+        children = []
+        for j in range(n):
+            child = idGenerator(self.width, seed=self.seed)
+            child.start, child.step = self.start + j * self.step, self.step * n
+            child.stop = self.stop
+            # skip the positions start + i * step (i < count) already drawn by the generator
+            child.taboo = {
+                key: max(0, -(-(count - j) // n)) for key, count in self.taboo.items()
+            }
+            child.round_keys = dict(self.round_keys)
+            children.append(child)
+        return children
+
+    def _permute(self, key, positions):
+        half_bits = np.uint64(self.half_bits)
+        mask = np.uint64((1 << self.half_bits) - 1)
+        round_keys = np.array(self.round_keys[key], dtype=np.uint64)
+        ids = positions.copy()
+        # cycle walking: re-encrypt the values falling out of [0, n_ids) until they fall into it
+        todo = np.ones(len(ids), dtype=bool)
+        while todo.any():
+            left, right = ids[todo] >> half_bits, ids[todo] & mask
+            for round_key in round_keys:
+                x = (right ^ round_key) * np.uint64(0x9E3779B97F4A7C15)
+                x ^= x >> np.uint64(29)
+                x *= np.uint64(0xBF58476D1CE4E5B9)
+                left, right = right, left ^ (x >> np.uint64(64 - self.half_bits))
+            ids[todo] = (left << half_bits) | right
+            todo[todo] = ids[todo] >= np.uint64(self.n_ids)
+        return ids
+
+    def _permute_one(self, key, position):
+        # Same as _permute, on a python int (much faster than numpy for a single id)
+        mask = (1 << self.half_bits) - 1
+        mask64 = (1 << 64) - 1
+        id_ = position
+        while True:
+            left, right = id_ >> self.half_bits, id_ & mask
+            for round_key in self.round_keys[key]:
+                x = ((right ^ round_key) * 0x9E3779B97F4A7C15) & mask64
+                x ^= x >> 29
+                x = (x * 0xBF58476D1CE4E5B9) & mask64
+                left, right = right, left ^ (x >> (64 - self.half_bits))
+            id_ = (left << self.half_bits) | right
+            if id_ < self.n_ids:
+                return id_
+
+    def run_many(self, key, n):
+        """
+        Return n new ids for key.
+
+        Parameters
+        ----------
+        key: str,
+            name of the id (e.g. 'person_id').
+        n: int,
+            number of ids.
+
+        Returns
+        -------
+        ids: np array of int64
+        """
+        i = self._reserve(key, n)
+        positions = np.uint64(self.start) + np.arange(
+            i, i + n, dtype=np.uint64
+        ) * np.uint64(self.step)
+        return self._permute(key, positions).astype(np.int64) + 8 * self.n_ids
+
+    def run(self, key):
         # Return random 8-digits id
-        return int(self.ids[key][i])
+        position = self.start + self._reserve(key, 1) * self.step
+        return self._permute_one(key, position) + 8 * self.n_ids
+
+
+class idAllocator:
+    """
+    Lease disjoint blocks of ids to (worker, chunk) pairs.
+
+    The positions of the permutation of each key (see idGenerator) are split into blocks of block_size
+    positions. Chunk c of worker w gets block c * n_workers + w: it only depends on w, c and n_workers,
+    so that workers (processes or machines) draw their chunks independently, with globally unique ids
+    that do not depend on the order in which chunks are drawn.
+
+    Parameters
+    ----------
+    n_workers: int,
+        number of workers.
+    block_size: int,
+        maximum number of ids per key in a chunk.
+    width: int (default 8),
+        number of digits of the ids.
+    seed: int (default None),
+        seed of the permutations, to share between workers. If None, drawn from np.random.
+    """
+
+    def __init__(self, n_workers, block_size, width=8, seed=None):
+        if n_workers < 1 or block_size < 1:
+            raise AttributeError(
+                f"n_workers {n_workers} and block_size {block_size} must be positive"
+            )
+        if seed is None:
+            seed = int(np.random.randint(0, 2 ** 32))
+        self.n_workers = n_workers
+        self.block_size = block_size
+        self.width = width
+        self.seed = seed
+        self.n_blocks = 10 ** (width - 1) // block_size
+
+    def lease(self, worker, chunk):
+        """
+        Return the id generator of a chunk of a worker.
 
+        Parameters
+        ----------
+        worker: int,
+            index of the worker (in [0, n_workers)).
+        chunk: int,
+            index of the chunk of the worker.
 
-def apply_deployment_per_hosp(df_to_process, df_visit, deployment_date_per_hospital):
+        Returns
+        -------
+        id_generator: idGenerator,
+            generator of the ids of the block (IndexError when drawing more than block_size ids of a key).
+        """
+        if not 0 <= worker < self.n_workers:
+            raise AttributeError(f"worker {worker} must be in [0, {self.n_workers})")
+        block = chunk * self.n_workers + worker
+        if not 0 <= block < self.n_blocks:
+            raise IndexError(
+                f"no more than {self.n_blocks} blocks of {self.block_size} ids "
+                f"of width {self.width} can be leased"
+            )
+        id_generator = idGenerator(self.width, seed=self.seed)
+        id_generator.start = block * self.block_size
+        id_generator.stop = id_generator.start + self.block_size
+        return id_generator
+
+
+def apply_deployment_per_hosp(
+    df_to_process, df_visit, deployment_date_per_hospital, rng=None
+):
     """
     Delete data for hospitals with deployment date.
 
@@ -58,6 +297,8 @@ def apply_deployment_per_hosp(df_to_process, df_visit, deployment_date_per_hospi
         visit_occurrence table.
     deployment_date_per_hospital: dict,
         date at which data if fully available (5% of missing data compare to 90% before)
+    rng: np.random.Generator (default None),
+        random generator (see check_rng).
 
     Returns
     -------
@@ -74,19 +315,20 @@ def apply_deployment_per_hosp(df_to_process, df_visit, deployment_date_per_hospi
         on="visit_occurrence_id",
         how="inner",
     )
-    list_idx = []
-    for i, row in df_to_process.iterrows():
-        if row["care_site_id"] in deployment_date_per_hospital:
-            if (
-                row["visit_start_datetime"].date()
-                >= deployment_date_per_hospital[row["care_site_id"]]
-                or np.random.random() < 0.05
-            ):
-                list_idx.append(i)
-        elif np.random.random() < 0.9:
-            list_idx.append(i)
+    rand = check_rng(rng).random(len(df_to_process))
+    keep = np.where(
+        df_to_process["care_site_id"].isin(list(deployment_date_per_hospital)).values,
+        (
+            _to_days(df_to_process["visit_start_datetime"])
+            >= _hospital_dates(
+                df_to_process["care_site_id"], deployment_date_per_hospital
+            )
+        )
+        | (rand < 0.05),
+        rand < 0.9,
+    )
     df_to_process = (
-        df_to_process.iloc[list_idx]
+        df_to_process[keep]
         .drop(columns=["visit_start_datetime"])
         .reset_index(drop=True)
     )
@@ -99,6 +341,9 @@ def apply_hosp_anomaly(df_to_process, date_col, value_col, hospital_anomaly):
     """
     Replace condition_source_value by np.nan for anomalies in hospital_anomaly.
 
+    All anomalies are looked up at once (one sorted list of intervals per hospital) and value_col is blanked
+    in place with a single mask, keeping the row order.
+
     Parameters
     ----------
     df_to_process: pandas.df,
@@ -115,23 +360,124 @@ def apply_hosp_anomaly(df_to_process, date_col, value_col, hospital_anomaly):
     df_to_process: pandas.df,
         flawed condition_occurrence table.
     """
-    for hospital, anomaly_range in hospital_anomaly:
-        min_date, max_date = anomaly_range
-        df_to_process = pd.concat(
-            [
-                df_to_process.query(
-                    f"care_site_id == @hospital and ({date_col}<=@max_date and {date_col}>=@min_date)"
-                ).assign(**{value_col: lambda pp: np.nan}),
-                df_to_process.query(
-                    f"care_site_id == @hospital and ({date_col}>@max_date or {date_col}<@min_date)"
-                ),
-                df_to_process.query("care_site_id != @hospital"),
-            ],
-            axis=0,
-        ).reset_index(drop=True)
+    if len(hospital_anomaly) == 0:
+        return df_to_process
+    df_to_process[value_col] = df_to_process[value_col].mask(
+        _anomaly_mask(
+            df_to_process["care_site_id"], df_to_process[date_col], hospital_anomaly
+        )
+    )
     return df_to_process
 
 
+def _anomaly_mask(care_site_id, dates, hospital_anomaly):
+    # True for rows whose date is in one of the anomaly ranges of their hospital.
+    # Intervals and rows are encoded as (hospital, day) keys so that a single searchsorted finds,
+    # for each row, the last interval starting before it.
+    hospitals = pd.Index(sorted({hospital for hospital, _ in hospital_anomaly}))
+    intervals = []
+    for i_hospital, min_day, max_day in sorted(
+        (
+            hospitals.get_loc(hospital),
+            np.datetime64(min_date, "D").astype(np.int64),
+            np.datetime64(max_date, "D").astype(np.int64),
+        )
+        for hospital, (min_date, max_date) in hospital_anomaly
+    ):
+        # merge overlapping intervals of the same hospital
+        if intervals and intervals[-1][0] == i_hospital and min_day <= intervals[-1][2]:
+            intervals[-1][2] = max(intervals[-1][2], max_day)
+        else:
+            intervals.append([i_hospital, min_day, max_day])
+    i_hospital, min_day, max_day = np.array(intervals, dtype=np.int64).T
+
+    row_hospital = hospitals.get_indexer(care_site_id)
+    row_days = _to_days(dates)
+    row_day = row_days.astype(np.int64)
+    i_interval = (
+        np.searchsorted(
+            _anomaly_key(i_hospital, min_day),
+            _anomaly_key(row_hospital, row_day),
+            side="right",
+        )
+        - 1
+    )
+    return (
+        (row_hospital >= 0)
+        & ~np.isnat(row_days)
+        & (i_interval >= 0)
+        & (i_hospital[i_interval] == row_hospital)
+        & (row_day <= max_day[i_interval])
+    )
+
+
+def _anomaly_key(i_hospital, day):
+    return i_hospital * 2 ** 32 + (day + 2 ** 31)
+
+
+def frame_drawing(func):
+    """
+    Mark func as a frame-level drawing function.
+
+    Row-wise drawing functions are called on each row and return one value. Frame-level ones are called
+    once as func(df, rng), with the whole frame (they may group it themselves) and the random generator to
+    use, and return an array with one value per row.
+
+    :param func: callable, frame-level drawing function
+    :return: func
+    """
+    func.frame_level = True
+    return func
+
+
+def as_frame_drawing(drawing_func):
+    """
+    Return drawing_func as a frame-level drawing function (row-wise functions are applied on each row).
+
+    :param drawing_func: callable, row-wise or frame-level (see frame_drawing) drawing function
+    :return: frame-level drawing function
+    """
+    if getattr(drawing_func, "frame_level", False):
+        return drawing_func
+
+    @frame_drawing
+    def f(df, rng):
+        if len(df) == 0:
+            return np.array([])
+        return df.apply(drawing_func, axis=1).values
+
+    return f
+
+
+def draw_uniform_mixture(size, mixture, rng=None):
+    """
+    Draw values from a mixture of uniform distributions.
+
+    :param size: int, number of values
+    :param mixture: list of tuple (weight, (low, high)), weight and bounds of each uniform distribution
+    :param rng: np.random.Generator, random generator (see check_rng)
+    :return: np array of float
+    """
+    rng = check_rng(rng)
+    weights = np.array([weight for weight, _ in mixture], dtype=float)
+    low, high = np.array([bounds for _, bounds in mixture], dtype=float).T
+    component = rng.choice(len(mixture), size, p=weights / weights.sum())
+    return rng.uniform(low[component], high[component])
+
+
+def survival_alpha(saturation):
+    """
+    Return the exp coeff of the survival curve for a given inflexion point.
+
+    :param saturation: int or np array of int, inflexion point
+    :return: float or np array of float, exp coeff
+    """
+    saturation = np.asarray(saturation)
+    return np.select(
+        [saturation == 5, saturation == 10, saturation == 15], [0.5, 0.3, 0.2], 0.15
+    )
+
+
 def survival_exp(final_survival_ratio=0.4, n_days=20, saturation=15):
     """
     Return decreasing exp curve information.
@@ -143,15 +489,7 @@ def survival_exp(final_survival_ratio=0.4, n_days=20, saturation=15):
     :return: alpha, float, exp coeff
     :return: start, float, x offset
     """
-    alpha = (
-        0.5
-        if saturation == 5
-        else 0.3
-        if saturation == 10
-        else 0.2
-        if saturation == 15
-        else 0.15
-    )
+    alpha = float(survival_alpha(saturation))
     start = np.log(1 - final_survival_ratio) / alpha
     x = np.arange(0, n_days)
     y = [np.exp(-alpha * (el - start)) + final_survival_ratio for el in x]
@@ -171,25 +509,139 @@ def return_survival_exp(y, alpha, beta, start):
     return -(1 / alpha) * np.log(y - beta) + start
 
 
-def draw_random_date(start_date, end_date):
+def draw_survival_days(final_survival_ratio, saturation, max_days, rng=None):
+    """
+    Draw the number of days before death on the survival curve of survival_exp, knowing that death happens
+    within max_days days.
+
+    The y-value is drawn uniformly between the curve value at max_days and 1, then mapped back to a day with
+    return_survival_exp (exact truncated inverse-CDF sampling, no rejection).
+
+    :param final_survival_ratio: float or np array of float (< 1), y offset
+    :param saturation: int or np array of int, inflexion point
+    :param max_days: int or np array of int (>= 1), death happens before this number of days
+    :param rng: np.random.Generator, random generator (see check_rng)
+    :return: np array of int
+    """
+    final_survival_ratio = np.asarray(final_survival_ratio, dtype=float)
+    max_days = np.asarray(max_days)
+    alpha = survival_alpha(saturation)
+    start = np.log(1 - final_survival_ratio) / alpha
+    # days are rounded to the closest integer: day max_days - 1 ends at max_days - 0.5
+    y_min = np.exp(-alpha * (max_days - 0.5 - start)) + final_survival_ratio
+    rand_survival = check_rng(rng).uniform(y_min, 1.0)
+    death_day = return_survival_exp(rand_survival, alpha, final_survival_ratio, start)
+    return np.minimum(np.rint(death_day), max_days - 1).astype(int)
+
+
+def draw_random_date(start_date, end_date, rng=None):
     """
     Draw a date between start_date and end_date in a uniform fashion.
 
     :param start_date: datetime.date, min date
     :param end_date: datetime.date, max date
+    :param rng: np.random.Generator, random generator (see check_rng)
     :return: datetime.date
     """
     time_between_dates = end_date - start_date
     days_between_dates = time_between_dates.days
-    random_number_of_days = int(np.random.uniform(0, days_between_dates))
+    random_number_of_days = int(check_rng(rng).uniform(0, days_between_dates))
     random_date = start_date + datetime.timedelta(days=random_number_of_days)
     return random_date
 
 
+def draw_random_dates(start_date, end_date, size=None, rng=None):
+    """
+    Draw dates between start_date and end_date in a uniform fashion (batch version of draw_random_date).
+
+    :param start_date: datetime.date or array of datetime64[D], min date(s)
+    :param end_date: datetime.date or array of datetime64[D], max date(s)
+    :param size: int, number of dates to draw if start_date and end_date are scalars
+    :param rng: np.random.Generator, random generator (see check_rng)
+    :return: np array of datetime64[D]
+    """
+    start_date = np.asarray(start_date, dtype="datetime64[D]")
+    end_date = np.asarray(end_date, dtype="datetime64[D]")
+    days_between_dates = (end_date - start_date).astype(int)
+    random_number_of_days = (
+        check_rng(rng).uniform(0, days_between_dates, size).astype(int)
+    )
+    return start_date + random_number_of_days
+
+
+def shift_years(dates, years):
+    """
+    Add a number of years to dates, as `date + relativedelta(years=years)` does (29/02 becomes 28/02).
+
+    :param dates: array of datetime64[D]
+    :param years: int or array of int
+    :return: np array of datetime64[D]
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    day = dates - months.astype("datetime64[D]")
+    shifted = months + 12 * np.asarray(years)
+    month_length = (shifted + 1).astype("datetime64[D]") - shifted.astype(
+        "datetime64[D]"
+    )
+    return shifted.astype("datetime64[D]") + np.minimum(day, month_length - 1)
+
+
+@functools.lru_cache(maxsize=128)
+def date_intensity_table(start_date, end_date, intensity=None):
+    """
+    Tabulate the cumulative distribution of the days between start_date and end_date for a daily intensity.
+    Tables are cached per (start_date, end_date, intensity).
+
+    :param start_date: datetime.date, min date
+    :param end_date: datetime.date, max date (excluded)
+    :param intensity: callable, intensity of the days given the array of day numbers since start_date
+        (e.g. an epidemic curve). Uniform if None.
+    :return: np array of float, cumulative distribution (read-only)
+    """
+    days_between_dates = (end_date - start_date).days
+    if intensity is None:
+        weights = np.ones(days_between_dates)
+    else:
+        weights = np.asarray(intensity(np.arange(0, days_between_dates)), dtype=float)
+    table = np.cumsum(weights)
+    table /= table[-1]
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=128)
+def exp_intensity_table(alpha, start_date, end_date):
+    """
+    Cached date_intensity_table of the increasing exp intensity exp(alpha * day).
+
+    :param alpha: float, exp coeff.
+    :param start_date: datetime.date, min date
+    :param end_date: datetime.date, max date
+    :return: np array of float, cumulative distribution (read-only)
+    """
+    return date_intensity_table(start_date, end_date, lambda day: np.exp(alpha * day))
+
+
+def draw_tabulated_dates(start_date, table, size=None, rng=None):
+    """
+    Draw dates from start_date following a cumulative distribution built by date_intensity_table.
+
+    :param start_date: datetime.date, min date
+    :param table: np array of float, cumulative distribution of the days since start_date
+    :param size: int, number of dates to draw (a single date if None)
+    :param rng: np.random.Generator, random generator (see check_rng)
+    :return: datetime64[D] or np array of datetime64[D]
+    """
+    n_days = np.searchsorted(table, check_rng(rng).random(size), side="right")
+    return np.datetime64(start_date, "D") + n_days
+
+
 def draw_exp_random_date(
     alpha,
     start_date,
     end_date,
+    rng=None,
 ):
     """
     Draw a date between start_date and end_date in an exponentially increasing fashion.
@@ -197,10 +649,26 @@ def draw_exp_random_date(
     :param alpha: float, exp coeff.
     :param start_date: datetime.date, min date
     :param end_date: datetime.date, max date
+    :param rng: np.random.Generator, random generator (see check_rng)
     :return: datetime.date
     """
-    days_between_dates = (end_date - start_date).days
-    y = np.array([np.exp(alpha * el) for el in np.arange(0, days_between_dates)])
-    n_days = int(abs(np.argmin(abs(y - np.random.uniform(low=1, high=max(y))))))
-    random_date = start_date + datetime.timedelta(days=n_days)
-    return random_date
+    return draw_tabulated_dates(
+        start_date, exp_intensity_table(alpha, start_date, end_date), rng=rng
+    ).astype(datetime.date)
+
+
+def draw_exp_random_dates(alpha, start_date, end_date, size=None, rng=None):
+    """
+    Draw dates between start_date and end_date in an exponentially increasing fashion (batch version of
+    draw_exp_random_date).
+
+    :param alpha: float, exp coeff.
+    :param start_date: datetime.date, min date
+    :param end_date: datetime.date, max date
+    :param size: int, number of dates to draw
+    :param rng: np.random.Generator, random generator (see check_rng)
+    :return: np array of datetime64[D]
+    """
+    return draw_tabulated_dates(
+        start_date, exp_intensity_table(alpha, start_date, end_date), size, rng
+    )
@@ -0,0 +1,249 @@
+import json
+import os
+from urllib.parse import quote
+
+import pandas as pd
+
+from .schema import compact_tables
+
+PARTITION_COLS = ["care_site_id", "visit_month"]
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+DATASET_FORMATS = {"parquet": "parquet", "arrow": "ipc"}
+
+
+def _import_pyarrow():
+    # pyarrow is only needed by datasets (pickle outputs do not depend on it)
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "parquet and arrow outputs require pyarrow (pip install pyarrow)"
+        ) from e
+    return pyarrow
+
+
+def _visit_partitions(df_visit):
+    # Partition values of each visit (schema = ['visit_occurrence_id', 'person_id'] + PARTITION_COLS)
+    return pd.DataFrame(
+        {
+            "visit_occurrence_id": df_visit["visit_occurrence_id"].to_numpy(),
+            "person_id": df_visit["person_id"].to_numpy(),
+            "care_site_id": df_visit["care_site_id"].to_numpy(),
+            "visit_month": pd.to_datetime(df_visit["visit_start_datetime"])
+            .dt.strftime("%Y-%m")
+            .to_numpy(),
+        }
+    )
+
+
+def _remove(file):
+    # Files may be hard links to cache entries (see DatasetCache): they are replaced, not overwritten
+    if os.path.lexists(file):
+        os.remove(file)
+
+
+def _partition_dir(col, value):
+    value = NULL_PARTITION if pd.isna(value) else quote(str(value), safe="")
+    return f"{col}={value}"
+
+
+class DatasetWriter:
+    """
+    Write tables to Parquet (or Arrow IPC) datasets partitioned by care_site_id and visit month.
+
+    Each table is a directory of hive partitions (e.g. 'visit/care_site_id=.../visit_month=2021-03/'),
+    with one file per call to write, so that chunks (see stream_tables) are written as they are drawn.
+    Rows get the partition of their visit: tables without care_site_id and visit_start_datetime are
+    matched with the 'visit' table of the same call, on visit_occurrence_id or else person_id (tables
+    that cannot be matched are not partitioned). A manifest.json with the schema and the number of rows
+    of each table is written when closing the writer.
+
+    Parameters
+    ----------
+    path: str,
+        directory of the datasets (files of a previous run are not removed).
+    format: str (default 'parquet'),
+        'parquet' or 'arrow' (Arrow IPC files).
+    row_group_size: int (default None),
+        maximum number of rows per parquet row group (each row group has min/max statistics).
+    compact: bool (default False),
+        if True, tables are written with a compact schema (see compact_table).
+    """
+
+    def __init__(self, path, format="parquet", row_group_size=None, compact=False):
+        if format not in DATASET_FORMATS:
+            raise AttributeError(f"format {format} must be in {list(DATASET_FORMATS)}")
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.format = format
+        self.row_group_size = row_group_size
+        self.compact = compact
+        self.n_writes = 0
+        self.manifest = {}
+        self.schemas = {}
+        # tables that were empty in all writes so far (their columns have no type yet)
+        self.empty = {}
+        os.makedirs(path, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, tables):
+        """
+        Append tables to the datasets.
+
+        :param tables: dict, tables to write (name -> pandas.df), e.g. a chunk of stream_tables
+        """
+        if self.compact:
+            tables = compact_tables(tables)
+        partitions = _visit_partitions(tables["visit"]) if "visit" in tables else None
+        for name, df in tables.items():
+            self._write_table(name, df, self._partition_keys(df, partitions))
+        self.n_writes += 1
+
+    @staticmethod
+    def _partition_keys(df, partitions):
+        # Partition values of each row of df (None if df is not partitioned)
+        if "care_site_id" in df and "visit_start_datetime" in df:
+            return _visit_partitions(df)[PARTITION_COLS]
+        if partitions is None:
+            return None
+        for key in ["visit_occurrence_id", "person_id"]:
+            if key in df:
+                return (
+                    partitions.drop_duplicates(key)
+                    .set_index(key)[PARTITION_COLS]
+                    .reindex(df[key].to_numpy())
+                    .reset_index(drop=True)
+                )
+        return None
+
+    def _write_table(self, name, df, keys):
+        partition_cols = [] if keys is None else PARTITION_COLS
+        data = df.drop(columns=partition_cols, errors="ignore").reset_index(drop=True)
+        if name not in self.manifest:
+            self.manifest[name] = {"n_rows": 0, "partition_cols": partition_cols}
+        self.manifest[name]["n_rows"] += len(df)
+        if name not in self.schemas:
+            if len(data) == 0:
+                # empty (e.g. object) columns would be typed as null: wait for rows to fix the schema
+                self.empty[name] = data
+                return
+            self._set_schema(name, self._dataset_schema(data))
+
+        groups = (
+            [((), data)]
+            if keys is None
+            else data.groupby(
+                [keys[col] for col in PARTITION_COLS], dropna=False, sort=True
+            )
+        )
+        for values, group in groups:
+            directory = os.path.join(
+                self.path,
+                name,
+                *[
+                    _partition_dir(col, value)
+                    for col, value in zip(PARTITION_COLS, values)
+                ],
+            )
+            os.makedirs(directory, exist_ok=True)
+            table = self.pa.Table.from_pandas(
+                group, schema=self.schemas[name], preserve_index=False
+            )
+            file = os.path.join(directory, f"part-{self.n_writes:05d}.{self.format}")
+            _remove(file)
+            if self.format == "parquet":
+                self.pa.parquet.write_table(
+                    table, file, row_group_size=self.row_group_size
+                )
+            else:
+                self.pa.feather.write_feather(table, file)
+
+    def _set_schema(self, name, schema):
+        self.schemas[name] = schema
+        self.empty.pop(name, None)
+        self.manifest[name]["schema"] = {
+            field.name: str(field.type) for field in schema
+        }
+
+    def _dataset_schema(self, data):
+        # Schema of the first non-empty write, with dictionaries that fit the categories of all writes
+        schema = self.pa.Schema.from_pandas(data, preserve_index=False)
+        for i, field in enumerate(schema):
+            if self.pa.types.is_dictionary(field.type):
+                schema = schema.set(
+                    i,
+                    field.with_type(
+                        self.pa.dictionary(self.pa.int32(), self.pa.string())
+                    ),
+                )
+        return schema
+
+    def close(self):
+        """
+        Write the manifest of the datasets.
+
+        Tables that were empty in all writes are written as a single empty file.
+        """
+        for name, data in list(self.empty.items()):
+            self._set_schema(name, self._dataset_schema(data))
+            self._write_table(name, data, None)
+        _remove(os.path.join(self.path, "manifest.json"))
+        with open(os.path.join(self.path, "manifest.json"), "w") as f:
+            json.dump(
+                {"format": self.format, "tables": self.manifest},
+                f,
+                indent=2,
+            )
+
+
+def read_table(path, name, columns=None, filter=None):
+    """
+    Read a table written by DatasetWriter.
+
+    Only the partitions matching filter and the requested columns are read, e.g.
+    read_table(path, 'visit', filter=pyarrow.dataset.field('visit_month') >= '2021-01').
+
+    :param path: str, directory of the datasets
+    :param name: str, name of the table
+    :param columns: list of str, columns to read (all if None)
+    :param filter: pyarrow.dataset.Expression, filter on rows (e.g. on partition columns)
+    :return: pandas.df
+    """
+    pa = _import_pyarrow()
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    dataset = pa.dataset.dataset(
+        os.path.join(path, name),
+        format=DATASET_FORMATS[manifest["format"]],
+        partitioning="hive" if manifest["tables"][name]["partition_cols"] else None,
+    )
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+
+def write_tables(tables, path, format="pickle", compact=False):
+    """
+    Write tables to a directory.
+
+    :param tables: dict, tables to write (name -> pandas.df)
+    :param path: str, output directory
+    :param format: str, 'pickle' (one 'df_{name}.pkl' file per table), or 'parquet' or 'arrow'
+        (partitioned datasets, see DatasetWriter)
+    :param compact: bool, if True, tables are written with a compact schema (see compact_table)
+    """
+    if compact:
+        tables = compact_tables(tables)
+    if format == "pickle":
+        for name, df in tables.items():
+            _remove(os.path.join(path, f"df_{name}.pkl"))
+            df.to_pickle(os.path.join(path, f"df_{name}.pkl"))
+    else:
+        with DatasetWriter(path, format=format) as writer:
+            writer.write(tables)
@@ -1,15 +1,8 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
-from lifelines.statistics import logrank_test
-from lifelines import KaplanMeierFitter
-from lifelines.plotting import add_at_risk_counts
-import altair as alt
 from dateutil.relativedelta import relativedelta
 
-kmf = KaplanMeierFitter()
-kmf_c = KaplanMeierFitter()
+# matplotlib, lifelines and altair are imported by the plotting functions (they are slow to import)
 # we assume that a patient who exits a hospital alife survives at least "survival_duration_days_if_survive" days since her admission date
 survival_duration_days_if_survive = 20
 
@@ -140,6 +133,13 @@ def plot_primary_kaplan(
     :return: None
         Plots the survival curves built by the Kaplan-Meier estimates.
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+    from lifelines import KaplanMeierFitter
+    from lifelines.plotting import add_at_risk_counts
+
+    kmf = KaplanMeierFitter()
+    kmf_c = KaplanMeierFitter()
     fig, axs = plt.subplots(1, 2)
     fig.set_size_inches(10.5, 5.5)
 
@@ -232,6 +232,11 @@ def plot_secondary_kaplan(
             f"drug_name: {drug_name} is not among available drug names."
         )
 
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+    from lifelines import KaplanMeierFitter
+
+    kmf = KaplanMeierFitter()
     fig, axs = plt.subplots(4, 2)
     fig.set_size_inches(10.5, 18.5)
 
@@ -317,6 +322,9 @@ def plot_primary_multicase_logranktest(
 
     :return: None
     """
+    import altair as alt
+    from lifelines.statistics import logrank_test
+
     dict_pvalues = {"case": [], "pvalue": [], "title": []}
     i_plot = 0
     for df_visit_kaplan, df_med_kaplan, name in list_case:
@@ -390,6 +398,9 @@ def plot_secondary_multicase_logranktest(
         drug on which filter data
     :return: None
     """
+    import altair as alt
+    from lifelines.statistics import logrank_test
+
     dict_pvalues = {"case": [], "pvalue": [], "title": []}
     i_plot = 0
     for i, age_range in enumerate([(5, 17), (18, 24), (25, 64), (65, 100)]):
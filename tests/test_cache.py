@@ -0,0 +1,25 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_generator.pipelines import cache_key
+
+
+def test_cache_key_stable():
+    params = {"seed": 42, "t_end": datetime.date(2021, 1, 1), "strata": [(0, 5), "f"]}
+    assert cache_key(params) == cache_key(dict(params))
+    assert cache_key(params) != cache_key({**params, "seed": 43})
+
+
+def test_cache_key_unserializable():
+    with pytest.raises(AttributeError):
+        cache_key({"func": object()})
+
+
+@pytest.mark.parametrize("module", [np, pd])
+def test_cache_key_versions(monkeypatch, module):
+    key = cache_key({"seed": 42})
+    monkeypatch.setattr(module, "__version__", "0.0.0")
+    assert cache_key({"seed": 42}) != key
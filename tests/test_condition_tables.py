@@ -0,0 +1,40 @@
+import datetime
+
+import pandas as pd
+
+from data_generator.pipelines.condition_tables import (
+    default_cim10_schedule,
+    draw_scheduled_codes,
+)
+
+
+def test_default_schedule_two_codes():
+    schedule = default_cim10_schedule(["A", "B"])
+    assert schedule == [
+        (None, {"A": 1}, 0),
+        (datetime.date(2025, 2, 1), {"B": 1}, 181),
+    ]
+    dates = pd.Series(pd.to_datetime(["2024-06-01", "2025-02-01", "2025-09-01"]))
+    codes = draw_scheduled_codes(dates, schedule, rng=0)
+    assert list(codes) == ["A", "A", "B"]
+
+
+def test_default_schedule_boundary_day():
+    # the code of the previous step applies on the start date of a step
+    schedule = default_cim10_schedule(["A", "B", "C", "D"])
+    starts = [start for start, _, _ in schedule[1:-1]]
+    assert starts == [datetime.date(2024, 11, 1), datetime.date(2024, 12, 17)]
+    dates = pd.Series(
+        pd.to_datetime(["2024-11-01", "2024-11-02", "2024-12-17", "2024-12-18"])
+    )
+    codes = draw_scheduled_codes(dates, schedule, rng=0)
+    assert list(codes) == ["A", "B", "B", "C"]
+
+
+def test_default_schedule_lengths():
+    for n in range(1, 8):
+        codes = [f"C{i}" for i in range(n)]
+        schedule = default_cim10_schedule(codes)
+        assert [list(step[1]) for step in schedule] == [[code] for code in codes]
+        starts = [start for start, _, _ in schedule[1:]]
+        assert starts == sorted(starts)
@@ -0,0 +1,77 @@
+from data_generator.exercises import ex5
+from data_generator.pipelines import TableDAG
+
+SCALE = 2
+
+
+def scale(x):
+    return x * SCALE
+
+
+def gen_a(stratum, tables, id_generator):
+    return {}
+
+
+def gen_b(stratum, tables, id_generator, n):
+    return {}
+
+
+def gen_c(stratum, tables, id_generator):
+    return {"c": scale(stratum)}
+
+
+def gen_d(stratum, tables, id_generator):
+    return {}
+
+
+def build_dag(n=1):
+    dag = TableDAG([1, 2], seed=0)
+    dag.add("a", gen_a, ["a"])
+    dag.add("b", gen_b, ["b"], inputs=["a"], params={"n": n})
+    dag.add("c", gen_c, ["c"], inputs=["a"])
+    dag.add("d", gen_d, ["d"], inputs=["b"])
+    return dag
+
+
+def fingerprints(dag):
+    return {name: dag.fingerprint(name) for name in dag.nodes}
+
+
+def changed(before, after):
+    return {name for name in before if before[name] != after[name]}
+
+
+def test_fingerprint_params():
+    # only the node and its downstream nodes are drawn again
+    before = fingerprints(build_dag())
+    assert fingerprints(build_dag()) == before
+    assert changed(before, fingerprints(build_dag(n=2))) == {"b", "d"}
+
+
+def test_fingerprint_helpers(monkeypatch):
+    # module-level values used by the functions of a node are hashed
+    before = fingerprints(build_dag())
+    monkeypatch.setitem(globals(), "SCALE", 3)
+    assert changed(before, fingerprints(build_dag())) == {"c"}
+
+
+def test_fingerprint_ex5_measurement():
+    # editing one measurement of ex5 only draws bio again
+    before = fingerprints(ex5.build_dag())
+    list_measurement = [
+        (concept, unit, 0.9 if concept == "hb" else ratio)
+        for concept, unit, ratio in ex5.list_bio_measurement
+    ]
+    after = fingerprints(ex5.build_dag(list_measurement=list_measurement))
+    assert changed(before, after) == {"bio"}
+
+
+def test_fingerprint_ex5_helper(monkeypatch):
+    # editing a helper of a node of ex5 only draws the node (and its downstream nodes) again
+    before = fingerprints(ex5.build_dag())
+
+    def bio_drawing(bio_concept, age_range, gender, case):
+        return ex5.uniform_drawing(0.5)
+
+    monkeypatch.setattr(ex5, "bio_drawing", bio_drawing)
+    assert changed(before, fingerprints(ex5.build_dag())) == {"bio"}
@@ -0,0 +1,23 @@
+import itertools
+
+import pandas as pd
+
+from data_generator.pipelines import gen_admin_tables, idGenerator, run_strata
+
+
+def gen_stratum(stratum, id_generator):
+    age_range, gender = stratum
+    df_person, df_visit = gen_admin_tables(
+        n=2, id_generator=id_generator, age_range=age_range, gender_list=[gender]
+    )
+    return {"person": df_person, "visit": df_visit}
+
+
+def test_run_strata_n_jobs():
+    strata = list(itertools.product([(0, 20), (20, 60)], ["f", "m"]))
+    tables = [
+        run_strata(gen_stratum, strata, idGenerator(seed=0), seed=42, n_jobs=n_jobs)
+        for n_jobs in [1, 2]
+    ]
+    for name in ["person", "visit"]:
+        pd.testing.assert_frame_equal(tables[0][name], tables[1][name])
@@ -0,0 +1,21 @@
+import os
+
+import pandas as pd
+
+from data_generator.pipelines import compile_scenario, load_scenario, run_plan
+
+SCENARIO_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "data_generator", "scenarios"
+)
+
+
+def test_run_plan_reproducible():
+    spec = load_scenario(os.path.join(SCENARIO_DIR, "exercise1.yaml"))
+    spec["strata"]["age_range"] = spec["strata"]["age_range"][:1]
+    spec["params"]["n_patient_per_cat"] = 1
+    plan = compile_scenario(spec)
+    tables = [run_plan(plan) for _ in range(2)]
+    assert tables[0].keys() == tables[1].keys()
+    for name in tables[0]:
+        # ids included
+        pd.testing.assert_frame_equal(tables[0][name], tables[1][name])